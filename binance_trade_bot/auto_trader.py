@@ -26,6 +26,11 @@ class AutoTrader:
     def initialize(self):
         self.initialize_trade_thresholds()
 
+    def close(self):
+        """
+        Release resources held by the strategy (threads, files). Called on shutdown
+        """
+
     def transaction_through_bridge(self, pair: Pair):
         """
         Jump from the source coin to the destination coin through bridge coin
@@ -29,6 +29,11 @@ class MockBinanceManager(BinanceAPIManager):
         self.config = config
         self.datetime = start_date or datetime(2021, 1, 1)
         self.balances = start_balances or {config.BRIDGE.symbol: 100}
+        # Bumped on every balance mutation so callers can detect trades without comparing dicts
+        self.balance_version = 0
+        # Prices only change when the clock advances; memoize lookups for the current tick
+        self._price_memo = {}
+        self._price_memo_time = None
 
     def setup_websockets(self):
         pass  # No websockets are needed for backtesting
@@ -43,6 +48,13 @@ class MockBinanceManager(BinanceAPIManager):
         """
         Get ticker price of a specific coin
         """
+        if self._price_memo_time != self.datetime:
+            self._price_memo.clear()
+            self._price_memo_time = self.datetime
+        val = self._price_memo.get(ticker_symbol)
+        if val is not None:
+            return val
+
         target_date = self.datetime.strftime("%d %b %Y %H:%M:%S")
         key = f"{ticker_symbol} - {target_date}"
         val = cache.get(key, None)
@@ -60,6 +72,8 @@ class MockBinanceManager(BinanceAPIManager):
                 cache[f"{ticker_symbol} - {date}"] = price
             cache.commit()
             val = cache.get(key, None)
+        if val is not None:
+            self._price_memo[ticker_symbol] = val
         return val
 
     def get_currency_balance(self, currency_symbol: str, force=False):
@@ -81,6 +95,7 @@ class MockBinanceManager(BinanceAPIManager):
         self.balances[origin_symbol] = self.balances.get(origin_symbol, 0) + order_quantity * (
             1 - self.get_fee(origin_coin, target_coin, False)
         )
+        self.balance_version += 1
         self.logger.info(
             f"Bought {origin_symbol}, balance now: {self.balances[origin_symbol]} - bridge: "
             f"{self.balances[target_symbol]}"
@@ -107,6 +122,7 @@ class MockBinanceManager(BinanceAPIManager):
             1 - self.get_fee(origin_coin, target_coin, True)
         )
         self.balances[origin_symbol] -= order_quantity
+        self.balance_version += 1
         self.logger.info(
             f"Sold {origin_symbol}, balance now: {self.balances[origin_symbol]} - bridge: "
             f"{self.balances[target_symbol]}"
@@ -116,6 +132,8 @@ class MockBinanceManager(BinanceAPIManager):
     def collate_coins(self, target_symbol: str):
         total = 0
         for coin, balance in self.balances.items():
+            if not balance:
+                continue
             if coin == target_symbol:
                 total += balance
                 continue
@@ -212,5 +230,6 @@ def backtest(
             n += 1
     except KeyboardInterrupt:
         pass
+    trader.close()
     cache.close()
     return manager
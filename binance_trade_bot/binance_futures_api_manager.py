@@ -2,24 +2,30 @@
 Binance 期货 API 管理器
 独立于现货API的期货交易模块
 """
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional, Dict, Literal
+from typing import Optional, Dict, List, Literal, Tuple
+import threading
 import time
-import math
 
 from binance.client import Client
-from binance.exceptions import BinanceAPIException
-from cachetools import TTLCache, cached
+from binance.exceptions import BinanceAPIException, BinanceRequestException
+
+try:
+    import orjson
+except ImportError:  # 可选依赖：未安装时使用 requests 自带的 json 解析
+    orjson = None
 
 from .config import Config
 from .database import Database
 from .logger import Logger
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FuturesPosition:
     """
     期货仓位数据结构 - 只包含仓位本身，不包含策略细节
+    只读快照，使用 __slots__ 避免每个实例携带 __dict__
     """
     symbol: str
     side: Literal['LONG', 'SHORT']
@@ -30,6 +36,22 @@ class FuturesPosition:
     liquidation_price: float
 
 
+class _FuturesClient(Client):
+    """
+    exchange info / position information 返回体很大（数百KB），
+    安装了 orjson 时用它解析响应，其余行为与 Client 一致
+    """
+
+    @staticmethod
+    def _handle_response(response):
+        if orjson is None or not (200 <= response.status_code < 300):
+            return Client._handle_response(response)
+        try:
+            return orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            raise BinanceRequestException("Invalid Response: %s" % response.text)
+
+
 class BinanceFuturesAPIManager:
     """
     Binance 期货 API 管理器
@@ -46,6 +68,19 @@ class BinanceFuturesAPIManager:
         ('close', 'long'):  {'side': 'SELL', 'positionSide': 'LONG'},
         ('close', 'short'): {'side': 'BUY',  'positionSide': 'SHORT'},
     }
+    # 四个公开方法直接绑定对应参数，热路径不再查表
+    _OPEN_LONG = _OPERATION_MAP[('open', 'long')]
+    _OPEN_SHORT = _OPERATION_MAP[('open', 'short')]
+    _CLOSE_LONG = _OPERATION_MAP[('close', 'long')]
+    _CLOSE_SHORT = _OPERATION_MAP[('close', 'short')]
+
+    # 精度信息缓存时间（12小时）及未知交易对的默认精度
+    _PRECISION_TTL = 43200
+    # 拉取失败后的重试间隔：避免故障期间每次下单/格式化数量都重新请求 exchange info
+    _PRECISION_RETRY = 60
+    _DEFAULT_PRECISION = {'quantity_precision': 3, 'price_precision': 2}
+    # 截断前的偏移量：避免 0.3 * 10 = 2.9999999999999996 这类误差丢掉一个步长
+    _QUANTITY_EPSILON = 1e-9
 
     def __init__(self, config: Config, db: Database, logger: Logger, testnet: bool = True):
         """初始化期货客户端"""
@@ -57,7 +92,7 @@ class BinanceFuturesAPIManager:
             }
             logger.info(f"Using proxy: {config.PROXY}")
 
-        self.binance_client = Client(
+        self.binance_client = _FuturesClient(
             config.BINANCE_API_KEY,
             config.BINANCE_API_SECRET_KEY,
             tld=config.BINANCE_TLD,
@@ -69,6 +104,14 @@ class BinanceFuturesAPIManager:
         self.config = config
         self.testnet = testnet
 
+        # 精度表：一次 futures_exchange_info 填充全部交易对
+        self._precision_table: Dict[str, Dict[str, int]] = {}
+        self._precision_mult: Dict[str, int] = {}  # symbol -> 10**quantity_precision
+        self._precision_expiry = 0.0
+        # place_orders 在多个线程中共用 binance_client：requests.Session 不保证线程安全，
+        # 下单请求在这把锁内串行发出，只有失败重试的等待并发进行
+        self._client_lock = threading.Lock()
+
     def setup_futures_mode(self, leverage: int = 3) -> bool:
         """
         设置期货模式：双向持仓 + 杠杆
@@ -103,29 +146,46 @@ class BinanceFuturesAPIManager:
             self.logger.error(f"❌ Failed to set leverage for {symbol}: {e}")
             return False
 
-    @cached(cache=TTLCache(maxsize=100, ttl=43200))
-    def get_symbol_precision(self, symbol: str) -> Dict[str, int]:
+    def _refresh_precision_table(self):
         """
-        获取交易对的精度信息（缓存12小时）
-        Returns: {'quantity_precision': 3, 'price_precision': 2}
+        一次性拉取所有交易对的精度（缓存12小时）
+        失败时保留旧表，60 秒后再重试
         """
+        if time.monotonic() < self._precision_expiry:
+            return
         try:
             info = self.binance_client.futures_exchange_info()
-            for s in info['symbols']:
-                if s['symbol'] == symbol:
-                    return {
-                        'quantity_precision': s['quantityPrecision'],
-                        'price_precision': s['pricePrecision'],
-                    }
-            return {'quantity_precision': 3, 'price_precision': 2}  # 默认值
         except BinanceAPIException as e:
-            self.logger.error(f"Failed to get precision for {symbol}: {e}")
-            return {'quantity_precision': 3, 'price_precision': 2}
+            self.logger.error(f"Failed to get futures exchange info: {e}")
+            self._precision_expiry = time.monotonic() + self._PRECISION_RETRY
+            return
+
+        self._precision_table = {
+            s['symbol']: {
+                'quantity_precision': s['quantityPrecision'],
+                'price_precision': s['pricePrecision'],
+            }
+            for s in info['symbols']
+        }
+        self._precision_mult = {
+            symbol: 10 ** p['quantity_precision'] for symbol, p in self._precision_table.items()
+        }
+        self._precision_expiry = time.monotonic() + self._PRECISION_TTL
+
+    def get_symbol_precision(self, symbol: str) -> Dict[str, int]:
+        """
+        获取交易对的精度信息
+        Returns: {'quantity_precision': 3, 'price_precision': 2}
+        """
+        self._refresh_precision_table()
+        return self._precision_table.get(symbol, self._DEFAULT_PRECISION)
 
     def _format_quantity(self, symbol: str, quantity: float) -> float:
-        """格式化数量到正确的精度"""
-        precision = self.get_symbol_precision(symbol)['quantity_precision']
-        return math.floor(quantity * 10**precision) / 10**precision
+        """格式化数量到正确的精度（向下取整）"""
+        self._refresh_precision_table()
+        mult = self._precision_mult.get(symbol) or 10 ** self._DEFAULT_PRECISION['quantity_precision']
+        # 用整数倍率相除而不是乘以 10**-p，后者会产生 0.7000000000000001 这类数量
+        return int(quantity * mult + self._QUANTITY_EPSILON) / mult
 
     def _execute_operation(self, operation: str, side: str, symbol: str, quantity: float) -> Optional[Dict]:
         """
@@ -141,31 +201,49 @@ class BinanceFuturesAPIManager:
             self.logger.error(f"Invalid operation: {operation} {side}")
             return None
 
-        # 格式化数量
-        formatted_qty = self._format_quantity(symbol, quantity)
+        return self._submit_order(params, symbol, quantity)
 
+    def _submit_order(self, params: Dict[str, str], symbol: str, quantity: float) -> Optional[Dict]:
+        """按操作参数格式化数量并下单"""
         return self._create_order(
             symbol=symbol,
             side=params['side'],
             positionSide=params['positionSide'],
-            quantity=formatted_qty
+            quantity=self._format_quantity(symbol, quantity)
         )
 
     def open_long(self, symbol: str, quantity: float) -> Optional[Dict]:
         """开多仓"""
-        return self._execute_operation('open', 'long', symbol, quantity)
+        return self._submit_order(self._OPEN_LONG, symbol, quantity)
 
     def open_short(self, symbol: str, quantity: float) -> Optional[Dict]:
         """开空仓"""
-        return self._execute_operation('open', 'short', symbol, quantity)
+        return self._submit_order(self._OPEN_SHORT, symbol, quantity)
 
     def close_long(self, symbol: str, quantity: float) -> Optional[Dict]:
         """平多仓"""
-        return self._execute_operation('close', 'long', symbol, quantity)
+        return self._submit_order(self._CLOSE_LONG, symbol, quantity)
 
     def close_short(self, symbol: str, quantity: float) -> Optional[Dict]:
         """平空仓"""
-        return self._execute_operation('close', 'short', symbol, quantity)
+        return self._submit_order(self._CLOSE_SHORT, symbol, quantity)
+
+    def place_orders(self, orders: List[Tuple[str, str, str, float]], max_workers: int = 5) -> List[Optional[Dict]]:
+        """
+        并发提交多笔订单（如组合调仓），各交易对的失败重试互不阻塞
+        下单请求本身经 _client_lock 串行发出，并发的只是重试前的等待
+        Args:
+            orders: [(operation, side, symbol, quantity), ...]，参数同 _execute_operation
+        Returns: 与 orders 顺序一致的下单结果
+        """
+        if not orders:
+            return []
+
+        # 先加载精度表，避免多个线程同时拉取 exchange info
+        self._refresh_precision_table()
+
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(orders))) as pool:
+            return list(pool.map(lambda order: self._execute_operation(*order), orders))
 
     def _create_order(self, symbol: str, side: str, positionSide: str, quantity: float,
                       price: Optional[float] = None, retry_count: int = 3) -> Optional[Dict]:
@@ -179,13 +257,14 @@ class BinanceFuturesAPIManager:
         for attempt in range(retry_count):
             try:
                 # 修正：使用真实订单，不是测试订单
-                order = self.binance_client.futures_create_order(
-                    symbol=symbol,
-                    side=side,
-                    positionSide=positionSide,
-                    type='MARKET',
-                    quantity=quantity,
-                )
+                with self._client_lock:
+                    order = self.binance_client.futures_create_order(
+                        symbol=symbol,
+                        side=side,
+                        positionSide=positionSide,
+                        type='MARKET',
+                        quantity=quantity,
+                    )
 
                 self.logger.info(
                     f"📊 Order created: {side} {quantity} {symbol} "
@@ -206,6 +285,19 @@ class BinanceFuturesAPIManager:
                     return None
                 time.sleep(1)
 
+    @staticmethod
+    def _parse_position(pos: Dict) -> FuturesPosition:
+        """API 仓位字典 -> FuturesPosition（数量可能是负数（SHORT），取绝对值）"""
+        return FuturesPosition(
+            symbol=pos['symbol'],
+            side=pos['positionSide'],
+            quantity=abs(float(pos['positionAmt'])),
+            entry_price=float(pos['entryPrice']),
+            mark_price=float(pos['markPrice']),
+            unrealized_profit=float(pos['unRealizedProfit']),
+            liquidation_price=float(pos['liquidationPrice']) if pos['liquidationPrice'] else 0.0,
+        )
+
     def get_position(self, symbol: str, side: Literal['LONG', 'SHORT']) -> Optional[FuturesPosition]:
         """
         查询指定方向的仓位
@@ -216,19 +308,8 @@ class BinanceFuturesAPIManager:
 
             for pos in positions:
                 # 双向持仓模式下会返回两个仓位：LONG 和 SHORT
-                if pos['positionSide'] == side:
-                    pos_amt = float(pos['positionAmt'])
-                    # 仓位数量可能是负数（SHORT），取绝对值
-                    if abs(pos_amt) > 0:
-                        return FuturesPosition(
-                            symbol=symbol,
-                            side=side,
-                            quantity=abs(pos_amt),
-                            entry_price=float(pos['entryPrice']),
-                            mark_price=float(pos['markPrice']),
-                            unrealized_profit=float(pos['unRealizedProfit']),
-                            liquidation_price=float(pos['liquidationPrice']) if pos['liquidationPrice'] else 0.0,
-                        )
+                if pos['positionSide'] == side and float(pos['positionAmt']) != 0:
+                    return self._parse_position(pos)
 
             return None  # 无仓位
 
@@ -242,22 +323,7 @@ class BinanceFuturesAPIManager:
         """
         try:
             positions = self.binance_client.futures_position_information()
-            result = []
-
-            for pos in positions:
-                pos_amt = float(pos['positionAmt'])
-                if abs(pos_amt) > 0:
-                    result.append(FuturesPosition(
-                        symbol=pos['symbol'],
-                        side=pos['positionSide'],
-                        quantity=abs(pos_amt),
-                        entry_price=float(pos['entryPrice']),
-                        mark_price=float(pos['markPrice']),
-                        unrealized_profit=float(pos['unRealizedProfit']),
-                        liquidation_price=float(pos['liquidationPrice']) if pos['liquidationPrice'] else 0.0,
-                    ))
-
-            return result
+            return [self._parse_position(pos) for pos in positions if float(pos['positionAmt']) != 0]
 
         except BinanceAPIException as e:
             self.logger.error(f"Failed to get all positions: {e}")
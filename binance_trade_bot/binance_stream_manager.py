@@ -2,7 +2,8 @@ import sys
 import threading
 import time
 from contextlib import contextmanager
-from typing import Dict, Set, Tuple
+from traceback import format_exc
+from typing import Callable, Dict, List, Set, Tuple
 
 import binance.client
 from binance.exceptions import BinanceAPIException, BinanceRequestException
@@ -108,9 +109,18 @@ class BinanceStreamManager:
         self.binance_client = binance_client
         self.pending_orders: Set[Tuple[str, int]] = set()
         self.pending_orders_mutex: threading.Lock = threading.Lock()
+        self.kline_callbacks: List[Callable[[dict], None]] = []
         self._processorThread = threading.Thread(target=self._stream_processor)
         self._processorThread.start()
 
+    def subscribe_klines(self, symbols: List[str], interval: str, callback: Callable[[dict], None]):
+        """
+        Subscribe to <symbol>@kline_<interval> streams. callback receives every UnicornFy kline
+        dict (forming and closed candles) on the stream processor thread.
+        """
+        self.kline_callbacks.append(callback)
+        self.bw_api_manager.create_stream([f"kline_{interval}"], [symbol.lower() for symbol in symbols])
+
     def acquire_order_guard(self):
         return OrderGuard(self.pending_orders, self.pending_orders_mutex)
 
@@ -194,6 +204,12 @@ class BinanceStreamManager:
         elif event_type == "24hrMiniTicker":
             for event in stream_data["data"]:
                 self.cache.ticker_values[event["symbol"]] = float(event["close_price"])
+        elif event_type == "kline":
+            for callback in self.kline_callbacks:
+                try:
+                    callback(stream_data["kline"])
+                except Exception:  # pylint: disable=broad-except
+                    self.logger.error(f"Kline callback failed: {format_exc()}", False)
         else:
             self.logger.error(f"Unknown event type found: {event_type}\n{stream_data}")
 
@@ -30,6 +30,13 @@ def main(skip_confirm=False):
         total_btc_value = 0
         total_usdt_value = 0
 
+        # Fetch every ticker price in one request instead of one request per asset
+        try:
+            prices = {ticker['symbol']: float(ticker['price']) for ticker in manager.binance_client.get_all_tickers()}
+        except Exception as e:  # pylint: disable=broad-except
+            logger.warning(f"Could not fetch ticker prices: {e}")
+            prices = {}
+
         # Calculate total account value
         for balance in account['balances']:
             asset = balance['asset']
@@ -46,20 +53,12 @@ def main(skip_confirm=False):
                     bridge_balance = total
                 else:
                     # Try to get BTC value
-                    try:
-                        price = manager.get_ticker_price(asset + 'BTC')
-                        if price:
-                            total_btc_value += total * price
-                    except:
-                        pass
+                    total_btc_value += total * prices.get(asset + 'BTC', 0)
 
         # Convert BTC to USDT for display
-        try:
-            btc_price = manager.get_ticker_price('BTCUSDT')
-            if btc_price:
-                total_usdt_value += total_btc_value * btc_price
-        except:
-            pass
+        btc_price = prices.get('BTCUSDT')
+        if btc_price:
+            total_usdt_value += total_btc_value * btc_price
 
         # Display account information
         print("\n" + "="*60)
@@ -114,6 +113,9 @@ def main(skip_confirm=False):
     try:
         while True:
             schedule.run_pending()
-            time.sleep(1)
+            # Sleep until the next job is due, waking at least once a second
+            idle = schedule.idle_seconds
+            time.sleep(max(0.05, min(idle if idle is not None else 1.0, 1.0)))
     finally:
-        manager.stream_manager.close()
\ No newline at end of file
+        trader.close()
+        manager.stream_manager.close()
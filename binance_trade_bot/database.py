@@ -7,7 +7,7 @@ from typing import List, Optional, Union
 
 from socketio import Client
 from socketio.exceptions import ConnectionError as SocketIOConnectionError
-from sqlalchemy import create_engine, func
+from sqlalchemy import create_engine, func, inspect
 from sqlalchemy.orm import Session, scoped_session, sessionmaker
 
 from .config import Config
@@ -213,6 +213,36 @@ class Database:
 
     def create_database(self):
         Base.metadata.create_all(self.engine)
+        if self.engine.dialect.name == "sqlite":
+            self._add_missing_columns()
+        for table in Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+
+    def _add_missing_columns(self):
+        """
+        create_all skips tables that already exist, so add columns introduced since the table was created.
+        Only nullable columns (or ones with a server default) can be added in place; anything else is logged.
+        """
+        inspector = inspect(self.engine)
+        preparer = self.engine.dialect.identifier_preparer
+        with self.engine.begin() as connection:
+            for table in Base.metadata.sorted_tables:
+                existing = {column["name"] for column in inspector.get_columns(table.name)}
+                for column in table.columns:
+                    if column.name in existing:
+                        continue
+                    if not column.nullable and column.server_default is None:
+                        self.logger.warning(
+                            f"Column {table.name}.{column.name} is missing and NOT NULL without a default; "
+                            "it has to be migrated manually"
+                        )
+                        continue
+                    column_type = column.type.compile(dialect=self.engine.dialect)
+                    connection.exec_driver_sql(
+                        f"ALTER TABLE {preparer.format_table(table)} "
+                        f"ADD COLUMN {preparer.format_column(column)} {column_type}"
+                    )
 
     def start_trade_log(self, from_coin: Coin, to_coin: Coin, selling: bool):
         return TradeLog(self, from_coin, to_coin, selling)
@@ -267,12 +297,23 @@ class Database:
                 session.expunge(st)
             return st
 
+    def get_position_states(self) -> List[PositionState]:
+        """获取全部仓位状态"""
+        session: Session
+        with self.db_session() as session:
+            states = session.query(PositionState).all()
+            session.expunge_all()
+            return states
+
     def save_position_state(self, position: PositionState):
         """保存或更新仓位状态"""
+        self.save_position_states([position])
+
+    def save_position_states(self, positions: List[PositionState]):
+        """批量保存或更新仓位状态"""
         session: Session
         with self.db_session() as session:
-            # merge 会自动处理 insert 或 update
-            session.merge(position)
+            PositionState.bulk_upsert(session, [position.to_row() for position in positions])
 
     def delete_position_state(self, symbol: str):
         """删除指定币种的仓位状态"""
@@ -7,11 +7,15 @@
 """
 import os
 import pickle
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Literal
+from datetime import datetime
+from typing import List, Dict, Optional, Literal, Tuple
 import time
 
+import numpy as np
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
 
@@ -70,16 +74,56 @@ class Position:
             return (self.entry_price - current_price) / self.entry_price * 100
 
 
-@dataclass
-class Trade:
-    """交易记录"""
-    timestamp: int
-    symbol: str
-    side: Literal['LONG', 'SHORT']
-    action: Literal['OPEN', 'CLOSE']
-    quantity: float
-    price: float
-    pnl: float = 0.0  # 只有CLOSE时有值
+# 交易记录（结构化数组的一行），pnl 只有CLOSE时有值
+TRADE_DTYPE = np.dtype([
+    ('timestamp', '<i8'),
+    ('symbol', 'U20'),
+    ('side', 'U5'),
+    ('action', 'U5'),
+    ('quantity', '<f8'),
+    ('price', '<f8'),
+    ('pnl', '<f8'),
+])
+
+
+# K线周期对应的毫秒数
+_INTERVAL_MS = {
+    '1m': 60 * 1000,
+    '3m': 3 * 60 * 1000,
+    '5m': 5 * 60 * 1000,
+    '15m': 15 * 60 * 1000,
+    '30m': 30 * 60 * 1000,
+    '1h': 60 * 60 * 1000,
+    '2h': 2 * 60 * 60 * 1000,
+    '4h': 4 * 60 * 60 * 1000,
+    '1d': 24 * 60 * 60 * 1000,
+}
+
+# K线的结构化数组格式（按列连续存储，切片即视图）
+KLINE_DTYPE = np.dtype([
+    ('open_time', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<f8'),
+    ('close_time', '<i8'),
+])
+
+
+def klines_to_array(raw_klines) -> np.ndarray:
+    """Binance原始K线（或旧缓存里的List[Candle]）转结构化数组"""
+    arr = np.empty(len(raw_klines), dtype=KLINE_DTYPE)
+    if len(raw_klines) == 0:
+        return arr
+    if isinstance(raw_klines[0], Candle):
+        for name in KLINE_DTYPE.names:
+            arr[name] = [getattr(k, name) for k in raw_klines]
+    else:
+        # 价格字段是字符串，由numpy按列统一解析
+        for i, name in enumerate(KLINE_DTYPE.names):
+            arr[name] = [k[i] for k in raw_klines]
+    return arr
 
 
 # ========================================
@@ -92,15 +136,31 @@ class DataLoader:
     策略：按固定块缓存（避免缓存爆炸）
     """
 
-    def __init__(self, cache_dir='./backtest_data', binance_client=None):
+    # 期货接口每分钟IP权重上限，超过90%才等待
+    _WEIGHT_LIMIT = 2400
+    _WEIGHT_THROTTLE = int(_WEIGHT_LIMIT * 0.9)
+
+    def __init__(self, cache_dir='./backtest_data', binance_client=None, max_cached_months: int = 24):
         self.cache_dir = cache_dir
         self.binance_client = binance_client
-        self.memory_cache = {}  # 内存缓存：{symbol_interval_month: List[Candle]}
+        # 内存缓存（LRU）：{symbol_interval_month: np.ndarray[KLINE_DTYPE]}
+        # 超过 max_cached_months 个数据块时淘汰最久未用的，磁盘上的块按需重新mmap
+        self.memory_cache: OrderedDict = OrderedDict()
+        self.max_cached_months = max_cached_months
+        self._formatted_cache: Dict[str, list] = {}  # 预格式化的Binance API格式行：{symbol_interval_month: List[tuple]}
+        self._cache_lock = threading.Lock()  # preload 会在多个线程中写缓存
+        # binance_client 在线程间共享：requests.Session 不保证线程安全，client.response 也只保存最后一次响应，
+        # 所以请求和读取该次响应的权重头必须在同一把锁内完成
+        self._client_lock = threading.Lock()
+        # 按交易对+周期拼接好的连续K线：{symbol_interval: np.ndarray[KLINE_DTYPE]}，每个最多 max_cached_months 个月
+        # 及其覆盖的月份范围：{symbol_interval: (首月, 末月, 起始毫秒, 结束毫秒)}
+        self.long_cache: Dict[str, np.ndarray] = {}
+        self._long_span: Dict[str, tuple] = {}
 
         # 创建缓存目录
         os.makedirs(cache_dir, exist_ok=True)
 
-    def get_klines(self, symbol: str, interval: str, start_ms: int, end_ms: int) -> List[Candle]:
+    def get_klines(self, symbol: str, interval: str, start_ms: int, end_ms: int) -> np.ndarray:
         """
         获取K线数据
         Args:
@@ -109,33 +169,131 @@ class DataLoader:
             start_ms: 开始时间戳（毫秒）
             end_ms: 结束时间戳（毫秒）
         """
-        # 按月加载数据块，然后在内存中切片
-        from datetime import datetime
+        # 在拼接好的连续数组上切片，范围不够时才补齐月份
+        key = f"{symbol}_{interval}"
+        span = self._long_span.get(key)
+        if span is None or start_ms < span[2] or end_ms >= span[3]:
+            self._extend_long_array(symbol, interval, start_ms, end_ms)
+        klines = self.long_cache[key]
+
+        # 数据按open_time有序，二分定位精确的时间范围
+        open_times = klines['open_time']
+        lo = np.searchsorted(open_times, start_ms, side='left')
+        hi = np.searchsorted(open_times, end_ms, side='right')
+        return klines[lo:hi]
+
+    def _extend_long_array(self, symbol: str, interval: str, start_ms: int, end_ms: int):
+        """
+        把 long_cache 扩展到覆盖 [start_ms, end_ms] 所在的月份
+        已覆盖的月份直接切片复用，只拼接新增的月份；总月数不超过 max_cached_months，
+        超出时丢弃本次请求之前最早的月份（回测游标只会向后走）
+        """
+        key = f"{symbol}_{interval}"
+        months = list(self._iter_months(start_ms, end_ms))
+        first, last = months[0], months[-1]
+        span = self._long_span.get(key)
+        if span is not None:
+            months = list(self._month_range(min(first, span[0]), max(last, span[1])))
+            if len(months) > self.max_cached_months:
+                months = months[min(len(months) - self.max_cached_months, months.index(first)):]
+
+        parts = []
+        old = self.long_cache.get(key)
+        reused = [ym for ym in months if span is not None and span[0] <= ym <= span[1]]
+        for ym in months:
+            if reused and ym == reused[0]:
+                # 已覆盖的连续月份：在旧数组上按时间切片
+                open_times = old['open_time']
+                lo = np.searchsorted(open_times, self._month_bounds(*reused[0])[0], side='left')
+                hi = np.searchsorted(open_times, self._month_bounds(*reused[-1])[1], side='left')
+                parts.append(old[lo:hi])
+            elif not (reused and reused[0] <= ym <= reused[-1]):
+                parts.append(self._get_month_klines(symbol, interval, *ym))
+
+        self.long_cache[key] = np.concatenate(parts)
+        first, last = months[0], months[-1]
+        self._long_span[key] = (first, last, self._month_bounds(*first)[0], self._month_bounds(*last)[1])
+
+    def get_formatted_klines(self, symbol: str, interval: str, start_ms: int, end_ms: int) -> list:
+        """
+        与 get_klines 相同的时间范围，但返回Binance API格式的行
+        每个月只在第一次访问时格式化，之后直接切片
+        行是缓存共享的元组（只读），调用方不能原地修改
+        """
+        rows = []
+        for year, month in self._iter_months(start_ms, end_ms):
+            klines = self._get_month_klines(symbol, interval, year, month)
+            cache_key = f"{symbol}_{interval}_{year:04d}-{month:02d}"
+            formatted = self._formatted_cache.get(cache_key)
+            if formatted is None:
+                formatted = [
+                    (open_time, str(o), str(h), str(l), str(c), str(v), close_time)
+                    for open_time, o, h, l, c, v, close_time in klines.tolist()
+                ]
+                self._formatted_cache[cache_key] = formatted
+
+            open_times = klines['open_time']
+            lo = np.searchsorted(open_times, start_ms, side='left')
+            hi = np.searchsorted(open_times, end_ms, side='right')
+            rows.extend(formatted[lo:hi])
+        return rows
+
+    def preload(self, symbols: List[str], intervals: List[str], start_ms: int, end_ms: int,
+                max_workers: int = 8):
+        """
+        并发预加载 [start_ms, end_ms] 覆盖的所有月份数据块
+        已在内存或本地文件中的月份不会重复下载
+        """
+        jobs = [
+            (symbol, interval, year, month)
+            for symbol in symbols
+            for interval in intervals
+            for year, month in self._iter_months(start_ms, end_ms)
+        ]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(self._get_month_klines, *job): job for job in jobs}
+            for future in as_completed(futures):
+                symbol, interval, year, month = futures[future]
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"❌ 预加载 {symbol} {interval} {year:04d}-{month:02d} 失败: {e}")
 
+        return len(jobs)
+
+    @staticmethod
+    def _iter_months(start_ms: int, end_ms: int):
+        """按时间顺序产出覆盖 [start_ms, end_ms] 的 (year, month)"""
         start_date = datetime.fromtimestamp(start_ms / 1000)
         end_date = datetime.fromtimestamp(end_ms / 1000)
+        return DataLoader._month_range((start_date.year, start_date.month), (end_date.year, end_date.month))
 
-        # 收集需要的所有月份数据
-        all_klines = []
-        current_year_month = (start_date.year, start_date.month)
-        end_year_month = (end_date.year, end_date.month)
-
-        while current_year_month <= end_year_month:
-            year, month = current_year_month
-            month_klines = self._get_month_klines(symbol, interval, year, month)
-            all_klines.extend(month_klines)
+    @staticmethod
+    def _month_range(first: tuple, last: tuple):
+        """按时间顺序产出 first 到 last（含）的 (year, month)"""
+        current_year_month = first
+        while current_year_month <= last:
+            yield current_year_month
 
             # 下一个月
+            year, month = current_year_month
             if month == 12:
                 current_year_month = (year + 1, 1)
             else:
                 current_year_month = (year, month + 1)
 
-        # 过滤到精确的时间范围
-        result = [k for k in all_klines if start_ms <= k.open_time <= end_ms]
-        return result
+    @staticmethod
+    def _month_bounds(year: int, month: int) -> tuple:
+        """某月的起止时间戳（毫秒，左闭右开）"""
+        start_date = datetime(year, month, 1)
+        if month == 12:
+            end_date = datetime(year + 1, 1, 1)
+        else:
+            end_date = datetime(year, month + 1, 1)
+        return int(start_date.timestamp() * 1000), int(end_date.timestamp() * 1000)
 
-    def _get_month_klines(self, symbol: str, interval: str, year: int, month: int) -> List[Candle]:
+    def _get_month_klines(self, symbol: str, interval: str, year: int, month: int) -> np.ndarray:
         """
         获取某月的完整K线数据（带缓存）
         """
@@ -143,81 +301,113 @@ class DataLoader:
         cache_key = f"{symbol}_{interval}_{year:04d}-{month:02d}"
 
         # 1. 检查内存缓存
-        if cache_key in self.memory_cache:
-            return self.memory_cache[cache_key]
+        klines = self.memory_cache.get(cache_key)
+        if klines is not None:
+            with self._cache_lock:
+                if cache_key in self.memory_cache:
+                    self.memory_cache.move_to_end(cache_key)
+            return klines
 
-        # 2. 检查本地文件缓存
-        cache_file = os.path.join(self.cache_dir, f"{cache_key}.pkl")
+        # 2. 检查本地文件缓存（.npy 按内存映射打开，不整体读入）
+        cache_file = os.path.join(self.cache_dir, f"{cache_key}.npy")
+        if not os.path.exists(cache_file):
+            self._migrate_pickle_cache(cache_key, cache_file)
         if os.path.exists(cache_file):
-            with open(cache_file, 'rb') as f:
-                klines = pickle.load(f)
-                self.memory_cache[cache_key] = klines
-                return klines
+            klines = np.load(cache_file, mmap_mode='r', allow_pickle=False)
+            self._remember(cache_key, klines)
+            return klines
 
         # 3. 从API下载
         if self.binance_client:
             # 计算该月的起止时间戳
-            from datetime import datetime
-            start_date = datetime(year, month, 1)
-            if month == 12:
-                end_date = datetime(year + 1, 1, 1)
-            else:
-                end_date = datetime(year, month + 1, 1)
-
-            start_ms = int(start_date.timestamp() * 1000)
-            end_ms = int(end_date.timestamp() * 1000)
-
+            start_ms, end_ms = self._month_bounds(year, month)
             klines = self._download_from_binance(symbol, interval, start_ms, end_ms)
 
             # 保存到文件缓存
-            with open(cache_file, 'wb') as f:
-                pickle.dump(klines, f)
+            np.save(cache_file, klines, allow_pickle=False)
 
-            self.memory_cache[cache_key] = klines
+            self._remember(cache_key, klines)
             return klines
 
         # 如果既没有缓存也没有API，返回空
-        return []
+        return np.empty(0, dtype=KLINE_DTYPE)
+
+    def _remember(self, cache_key: str, klines: np.ndarray):
+        """写入内存缓存，超出上限时淘汰最久未用的数据块"""
+        with self._cache_lock:
+            self.memory_cache[cache_key] = klines
+            self.memory_cache.move_to_end(cache_key)
+            while len(self.memory_cache) > self.max_cached_months:
+                evicted_key, _ = self.memory_cache.popitem(last=False)
+                self._formatted_cache.pop(evicted_key, None)
+
+    def _migrate_pickle_cache(self, cache_key: str, cache_file: str):
+        """把旧版 .pkl 缓存（List[Candle]）升级为 .npy"""
+        legacy_file = os.path.join(self.cache_dir, f"{cache_key}.pkl")
+        if not os.path.exists(legacy_file):
+            return
+
+        with open(legacy_file, 'rb') as f:
+            klines = pickle.load(f)
+        if not isinstance(klines, np.ndarray):
+            klines = klines_to_array(klines)
+        np.save(cache_file, klines, allow_pickle=False)
+        os.remove(legacy_file)
 
-    def _download_from_binance(self, symbol: str, interval: str, start_ms: int, end_ms: int) -> List[Candle]:
+    def _download_from_binance(self, symbol: str, interval: str, start_ms: int, end_ms: int) -> np.ndarray:
         """从Binance API下载数据"""
-        from datetime import datetime
         start_str = datetime.fromtimestamp(start_ms / 1000).strftime('%Y-%m-%d')
         end_str = datetime.fromtimestamp(end_ms / 1000).strftime('%Y-%m-%d')
         print(f"📥 Downloading {symbol} {interval} data: {start_str} ~ {end_str}")
 
         all_klines = []
         current_start = start_ms
+        interval_ms = _INTERVAL_MS.get(interval, 60 * 1000)
 
         # Binance API限制每次最多1000根K线
         while current_start < end_ms:
             try:
-                raw_klines = self.binance_client.futures_klines(
-                    symbol=symbol,
-                    interval=interval,
-                    startTime=current_start,
-                    endTime=end_ms,
-                    limit=1000
-                )
+                with self._client_lock:
+                    raw_klines = self.binance_client.futures_klines(
+                        symbol=symbol,
+                        interval=interval,
+                        startTime=current_start,
+                        endTime=end_ms - 1,  # endTime按open_time包含，不取下个月的第一根
+                        limit=1000
+                    )
+                    # 避免API限流（权重接近上限时持锁等待，其他线程也一起暂停）
+                    self._throttle()
 
                 if not raw_klines:
                     break
 
-                klines = [Candle.from_binance(k) for k in raw_klines]
-                all_klines.extend(klines)
+                all_klines.extend(raw_klines)
 
-                # 更新起始时间到最后一根K线之后
-                current_start = klines[-1].close_time + 1
+                # 不足一页说明已经取完
+                if len(raw_klines) < 1000:
+                    break
 
-                # 避免API限流
-                time.sleep(0.5)
+                # 下一页从最后一根K线的下一个开盘时间开始
+                current_start = raw_klines[-1][0] + interval_ms
 
             except BinanceAPIException as e:
                 print(f"❌ Failed to download data: {e}")
                 break
 
         print(f"✅ Downloaded {len(all_klines)} candles")
-        return all_klines
+        return klines_to_array(all_klines)
+
+    def _throttle(self):
+        """
+        根据本次响应的 X-MBX-USED-WEIGHT-1M 限流，权重接近上限时等到下一分钟
+        必须在 _client_lock 内、紧跟请求调用
+        """
+        response = getattr(self.binance_client, 'response', None)
+        if response is None:
+            return
+        used_weight = response.headers.get('X-MBX-USED-WEIGHT-1M')
+        if used_weight and int(used_weight) > self._WEIGHT_THROTTLE:
+            time.sleep(60 - time.time() % 60)
 
 
 # ========================================
@@ -232,15 +422,33 @@ class BacktestAPIManager:
 
     def __init__(self, data_loader: DataLoader, initial_balance: float = 10000, leverage: int = 3):
         self.data_loader = data_loader
+        # 以下按当前tick缓存，虚拟时间推进时清空（见 current_time）
+        self._price_memo: Dict[str, float] = {}  # 标记价格
+        self._interval_starts: Dict[int, int] = {}  # interval_ms -> 当前K线开盘时间
+        # 每个 (symbol, interval, limit) 的滚动窗口：(上次的K线开盘时间, 已完成K线的deque)
+        self._rolling: Dict[Tuple[str, str, int], tuple] = {}
         self.current_time = None  # 回测引擎会设置这个虚拟时间（毫秒）
         self.balance = initial_balance
         self.positions: Dict[str, Position] = {}
-        self.trades: List[Trade] = []
+        # 交易记录按行写入预分配的结构化数组，写满时容量翻倍
+        self._trades = np.empty(1024, dtype=TRADE_DTYPE)
+        self._trade_n = 0
         self.leverage = leverage
 
         # 模拟 binance_client（策略代码会调用）
         self.binance_client = self
 
+    @property
+    def current_time(self) -> Optional[int]:
+        return self._current_time
+
+    @current_time.setter
+    def current_time(self, ts: Optional[int]):
+        """推进虚拟时间，同时清空按tick缓存的数据"""
+        self._current_time = ts
+        self._price_memo.clear()
+        self._interval_starts.clear()
+
     def futures_klines(self, symbol: str, interval: str, limit: int = 100, **kwargs):
         """
         模拟 binance_client.futures_klines()
@@ -248,58 +456,71 @@ class BacktestAPIManager:
 
         关键：只返回已完成的K线，避免数据泄露
         例如：当前时间 10:00，只能看到 09:00 之前完成的K线
+
+        注意：每根K线是缓存共享的元组，不能原地修改（需要修改时先 list(row)）
         """
         if self.current_time is None:
             raise RuntimeError("current_time not set by backtest engine")
 
         # 计算时间范围
-        interval_ms = self._interval_to_ms(interval)
+        interval_ms = _INTERVAL_MS.get(interval, 60 * 1000)
 
         # 关键修复：只获取"已完成"的K线
-        # 当前时间向下取整到上一根K线的结束时间
-        current_interval_start = (self.current_time // interval_ms) * interval_ms
+        # 当前时间向下取整到上一根K线的结束时间（同一tick内按周期复用）
+        current_interval_start = self._interval_starts.get(interval_ms)
+        if current_interval_start is None:
+            current_interval_start = (self.current_time // interval_ms) * interval_ms
+            self._interval_starts[interval_ms] = current_interval_start
         end_time = current_interval_start  # 只到上一根K线结束
         start_time = end_time - (limit * interval_ms)
 
-        # 从DataLoader获取数据
-        klines = self.data_loader.get_klines(symbol, interval, start_time, end_time)
+        # 时间单调推进时，窗口只需在末尾追加新完成的K线、从头部淘汰移出窗口的K线
+        rolling_key = (symbol, interval, limit)
+        rolling = self._rolling.get(rolling_key)
+        if rolling is not None and rolling[0] <= end_time < rolling[0] + limit * interval_ms:
+            last_start, window = rolling
+            if end_time > last_start:
+                # open_time 在 [last_start, end_time) 的K线在上一tick之后完成
+                window.extend(self.data_loader.get_formatted_klines(symbol, interval, last_start, end_time - 1))
+                while window and window[0][0] < start_time:
+                    window.popleft()
+        else:
+            # 从DataLoader获取数据（已是Binance API格式，策略代码期望的格式）
+            klines = self.data_loader.get_formatted_klines(symbol, interval, start_time, end_time)
 
-        # 过滤：只返回 close_time < current_time 的K线
-        klines = [k for k in klines if k.close_time < self.current_time]
+            # 过滤：只返回 close_time < current_time 的K线
+            # 数据按时间有序，未完成的K线只可能出现在末尾
+            while klines and klines[-1][6] >= self.current_time:
+                klines.pop()
 
-        # 只返回最后 limit 根
-        klines = klines[-limit:]
+            # 只保留最后 limit 根
+            window = deque(klines, maxlen=limit)
+        self._rolling[rolling_key] = (end_time, window)
+        klines = list(window)
 
         if len(klines) < limit:
             # 数据不足警告（但不抛异常，让策略自己决定如何处理）
             print(f"⚠️  数据不足：期望{limit}根，实际{len(klines)}根 @ {self._ts_to_str(self.current_time)}")
 
-        # 转换为Binance API格式（策略代码期望的格式）
-        return [
-            [
-                k.open_time,
-                str(k.open),
-                str(k.high),
-                str(k.low),
-                str(k.close),
-                str(k.volume),
-                k.close_time,
-            ]
-            for k in klines
-        ]
+        return klines
 
     def _ts_to_str(self, ts: int) -> str:
         """时间戳转字符串（辅助方法）"""
-        from datetime import datetime
         return datetime.fromtimestamp(ts / 1000).strftime('%Y-%m-%d %H:%M')
 
     def get_mark_price(self, symbol: str) -> Optional[float]:
         """获取当前标记价格"""
+        price = self._price_memo.get(symbol)
+        if price is not None:
+            return price
+
         try:
             # 获取当前时间点的1分钟K线
             klines = self.futures_klines(symbol, '1m', limit=1)
             if klines:
-                return float(klines[-1][4])  # 收盘价
+                price = float(klines[-1][4])  # 收盘价
+                self._price_memo[symbol] = price
+                return price
             return None
         except Exception as e:
             print(f"Failed to get mark price for {symbol}: {e}")
@@ -393,14 +614,7 @@ class BacktestAPIManager:
                     total_margin=cost,  # 记录保证金
                 )
 
-            self.trades.append(Trade(
-                timestamp=self.current_time,
-                symbol=symbol,
-                side=side,
-                action='OPEN',
-                quantity=quantity,
-                price=price,
-            ))
+            self._record_trade(symbol, side, 'OPEN', quantity, price)
 
             return {'orderId': f"BT_{self.current_time}_{symbol}"}
 
@@ -429,32 +643,28 @@ class BacktestAPIManager:
             if pos.quantity <= 0:
                 del self.positions[position_key]
 
-            self.trades.append(Trade(
-                timestamp=self.current_time,
-                symbol=symbol,
-                side=side,
-                action='CLOSE',
-                quantity=quantity,
-                price=price,
-                pnl=pnl,
-            ))
+            self._record_trade(symbol, side, 'CLOSE', quantity, price, pnl)
 
             return {'orderId': f"BT_{self.current_time}_{symbol}_CLOSE"}
 
+    @property
+    def trades(self) -> np.ndarray:
+        """已记录的交易（TRADE_DTYPE 结构化数组）"""
+        return self._trades[:self._trade_n]
+
+    def _record_trade(self, symbol: str, side: Literal['LONG', 'SHORT'], action: Literal['OPEN', 'CLOSE'],
+                      quantity: float, price: float, pnl: float = 0.0):
+        """追加一条交易记录"""
+        if self._trade_n == len(self._trades):
+            grown = np.empty(len(self._trades) * 2, dtype=TRADE_DTYPE)
+            grown[:self._trade_n] = self._trades
+            self._trades = grown
+        self._trades[self._trade_n] = (self.current_time, symbol, side, action, quantity, price, pnl)
+        self._trade_n += 1
+
     def _interval_to_ms(self, interval: str) -> int:
         """K线周期转毫秒"""
-        mapping = {
-            '1m': 60 * 1000,
-            '3m': 3 * 60 * 1000,
-            '5m': 5 * 60 * 1000,
-            '15m': 15 * 60 * 1000,
-            '30m': 30 * 60 * 1000,
-            '1h': 60 * 60 * 1000,
-            '2h': 2 * 60 * 60 * 1000,
-            '4h': 4 * 60 * 60 * 1000,
-            '1d': 24 * 60 * 60 * 1000,
-        }
-        return mapping.get(interval, 60 * 1000)
+        return _INTERVAL_MS.get(interval, 60 * 1000)
 
     def _format_quantity(self, symbol: str, quantity: float) -> float:
         """格式化数量（回测中简化处理）"""
@@ -475,11 +685,20 @@ class BacktestEngine:
     4. 记录和统计结果
     """
 
+    # 预热的K线周期：1m用于标记价格，5m为策略常用周期
+    WARMUP_INTERVALS = ['1m', '5m']
+    # 预热时在首个时间点之前额外加载的5m K线数量
+    WARMUP_LOOKBACK = 100
+
     def __init__(self, strategy_class, config, binance_client=None):
         self.strategy_class = strategy_class
         self.config = config
         self.data_loader = DataLoader(binance_client=binance_client)
-        self.equity_curve = []  # 权益曲线
+        # 权益曲线（按列存储，run() 中按周期数预分配）
+        self.ts_arr = np.empty(0, dtype=np.int64)
+        self.eq_arr = np.empty(0, dtype=np.float64)
+        self.bal_arr = np.empty(0, dtype=np.float64)
+        self.pos_cnt = np.empty(0, dtype=np.int32)
 
     def run(self, start_date: str, end_date: str, initial_balance: float = 10000,
             interval: str = '1h', leverage: int = 3):
@@ -534,7 +753,10 @@ class BacktestEngine:
 
         # 4. 数据预热：预先下载需要的历史数据
         print("\n📦 数据预热中...")
-        self._warmup_data(backtest_api, timestamps, strategy)
+        symbols = self._warmup_data(backtest_api, timestamps, strategy)
+
+        # 按时间序列对齐的标记价格，权益计算直接按下标取值
+        close_by_symbol = self._load_mark_prices(symbols, timestamps)
 
         # 5. 时间循环
         print("\n🔄 开始回测循环...\n")
@@ -542,6 +764,13 @@ class BacktestEngine:
         error_count = 0
         max_errors = max(10, len(timestamps) // 10)  # 最多允许10%的周期失败
 
+        n = len(timestamps)
+        self.ts_arr = np.empty(n, dtype=np.int64)
+        self.eq_arr = np.empty(n, dtype=np.float64)
+        self.bal_arr = np.empty(n, dtype=np.float64)
+        self.pos_cnt = np.empty(n, dtype=np.int32)
+        recorded = 0  # 出错的周期不记录权益
+
         for i, ts in enumerate(timestamps):
             # 设置当前虚拟时间
             backtest_api.current_time = ts
@@ -561,18 +790,25 @@ class BacktestEngine:
                 continue
 
             # 记录权益
+            # 每个交易对每个tick只取一次价格（同一交易对的多空仓位共用）
             total_equity = backtest_api.balance
-            for pos_key, pos in backtest_api.positions.items():
-                current_price = backtest_api.get_mark_price(pos.symbol)
+            prices = {}
+            for pos in backtest_api.positions.values():
+                symbol = pos.symbol
+                if symbol in prices:
+                    current_price = prices[symbol]
+                else:
+                    closes = close_by_symbol.get(symbol)
+                    current_price = closes[i] if closes is not None else backtest_api.get_mark_price(symbol)
+                    prices[symbol] = current_price
                 if current_price:
                     total_equity += pos.unrealized_pnl(current_price)
 
-            self.equity_curve.append({
-                'timestamp': ts,
-                'equity': total_equity,
-                'balance': backtest_api.balance,
-                'positions': len(backtest_api.positions),
-            })
+            self.ts_arr[recorded] = ts
+            self.eq_arr[recorded] = total_equity
+            self.bal_arr[recorded] = backtest_api.balance
+            self.pos_cnt[recorded] = len(backtest_api.positions)
+            recorded += 1
 
             # 进度显示（每10%或至少每100个周期）
             progress_step = max(1, len(timestamps) // 10)
@@ -581,6 +817,11 @@ class BacktestEngine:
                 print(f"⏳ 进度: {progress:.0f}% | 权益: ${total_equity:.2f} | "
                       f"持仓数: {len(backtest_api.positions)}")
 
+        self.ts_arr = self.ts_arr[:recorded]
+        self.eq_arr = self.eq_arr[:recorded]
+        self.bal_arr = self.bal_arr[:recorded]
+        self.pos_cnt = self.pos_cnt[:recorded]
+
         # 6. 输出统计
         if error_count > 0:
             print(f"\n⚠️  警告：回测过程中发生 {error_count} 次错误")
@@ -591,7 +832,7 @@ class BacktestEngine:
 
     def _warmup_data(self, api: 'BacktestAPIManager', timestamps: List[int], strategy):
         """
-        数据预热：提前下载策略需要的历史数据
+        数据预热：一次性并发下载整个回测区间需要的历史数据
         """
         # 检测策略需要的symbol列表
         if hasattr(strategy, 'symbols'):
@@ -600,14 +841,17 @@ class BacktestEngine:
             symbols = [strategy.symbol]
         else:
             print("⚠️  无法检测策略的交易对，跳过数据预热")
-            return
+            return []
 
-        # 预热第一个时间点的数据（确保有足够的历史K线）
         first_timestamp = timestamps[0]
-        api.current_time = first_timestamp
+        start_ms = first_timestamp - self.WARMUP_LOOKBACK * self._interval_to_ms('5m')
 
         print(f"预热交易对: {', '.join(symbols)}")
+        blocks = self.data_loader.preload(symbols, self.WARMUP_INTERVALS, start_ms, timestamps[-1])
+        print(f"预热数据块: {blocks}")
 
+        # 检查第一个时间点的数据（确保有足够的历史K线）
+        api.current_time = first_timestamp
         for symbol in symbols:
             try:
                 # 尝试获取策略需要的K线数据（假设最多需要100根）
@@ -618,35 +862,44 @@ class BacktestEngine:
                 print(f"❌ 预热 {symbol} 数据失败: {e}")
 
         print("✅ 数据预热完成\n")
+        return symbols
+
+    def _load_mark_prices(self, symbols: List[str], timestamps: List[int]) -> Dict[str, list]:
+        """
+        预先计算每个时间点的标记价格（与 get_mark_price 口径一致：
+        当前分钟之前最后一根已完成1m K线的收盘价），缺数据的时间点为0
+        """
+        minute_ms = self._interval_to_ms('1m')
+        ts = np.asarray(timestamps, dtype=np.int64)
+        minute_starts = ts // minute_ms * minute_ms
+
+        close_by_symbol = {}
+        for symbol in symbols:
+            klines = self.data_loader.get_klines(symbol, '1m', int(minute_starts[0]) - minute_ms,
+                                                 int(minute_starts[-1]))
+            idx = np.searchsorted(klines['close_time'], ts, side='left') - 1
+            valid = idx >= 0
+            safe_idx = np.where(valid, idx, 0)
+            if len(klines):
+                # 只认当前分钟前一根之内的K线，与 futures_klines(limit=1) 的时间窗口相同
+                valid &= klines['open_time'][safe_idx] >= minute_starts - minute_ms
+                closes = np.where(valid, klines['close'][safe_idx], 0.0)
+            else:
+                closes = np.zeros(len(ts))
+            close_by_symbol[symbol] = closes.tolist()
+        return close_by_symbol
 
     def _generate_timestamps(self, start_date: str, end_date: str, interval: str) -> List[int]:
         """生成时间戳序列"""
-        start = datetime.strptime(start_date, '%Y-%m-%d')
-        end = datetime.strptime(end_date, '%Y-%m-%d')
+        start_ms = int(datetime.strptime(start_date, '%Y-%m-%d').timestamp() * 1000)
+        end_ms = int(datetime.strptime(end_date, '%Y-%m-%d').timestamp() * 1000)
 
         interval_ms = self._interval_to_ms(interval)
-        interval_seconds = interval_ms / 1000
-
-        timestamps = []
-        current = start
-
-        while current <= end:
-            timestamps.append(int(current.timestamp() * 1000))
-            current += timedelta(seconds=interval_seconds)
-
-        return timestamps
+        return np.arange(start_ms, end_ms + 1, interval_ms, dtype=np.int64).tolist()
 
     def _interval_to_ms(self, interval: str) -> int:
         """K线周期转毫秒"""
-        mapping = {
-            '1m': 60 * 1000,
-            '5m': 5 * 60 * 1000,
-            '15m': 15 * 60 * 1000,
-            '1h': 60 * 60 * 1000,
-            '4h': 4 * 60 * 60 * 1000,
-            '1d': 24 * 60 * 60 * 1000,
-        }
-        return mapping.get(interval, 60 * 60 * 1000)
+        return _INTERVAL_MS.get(interval, 60 * 60 * 1000)
 
     def _ts_to_str(self, ts: int) -> str:
         """时间戳转字符串"""
@@ -659,7 +912,7 @@ class BacktestEngine:
         print("=" * 60)
 
         # 基本统计
-        final_equity = self.equity_curve[-1]['equity'] if self.equity_curve else initial_balance
+        final_equity = float(self.eq_arr[-1]) if len(self.eq_arr) else initial_balance
         total_return = (final_equity - initial_balance) / initial_balance * 100
 
         print(f"初始资金: ${initial_balance:.2f}")
@@ -668,18 +921,18 @@ class BacktestEngine:
 
         # 交易统计
         trades = api.trades
-        closed_trades = [t for t in trades if t.action == 'CLOSE']
+        pnls = trades['pnl'][trades['action'] == 'CLOSE']
 
-        if closed_trades:
-            winning_trades = [t for t in closed_trades if t.pnl > 0]
-            losing_trades = [t for t in closed_trades if t.pnl < 0]
+        if len(pnls):
+            winning = pnls[pnls > 0]
+            losing = pnls[pnls < 0]
 
-            win_rate = len(winning_trades) / len(closed_trades) * 100
-            avg_win = sum(t.pnl for t in winning_trades) / len(winning_trades) if winning_trades else 0
-            avg_loss = sum(t.pnl for t in losing_trades) / len(losing_trades) if losing_trades else 0
+            win_rate = len(winning) / len(pnls) * 100
+            avg_win = winning.mean() if len(winning) else 0
+            avg_loss = losing.mean() if len(losing) else 0
 
-            print(f"\n交易总数: {len(closed_trades)}")
-            print(f"胜率: {win_rate:.1f}% ({len(winning_trades)}胜 / {len(losing_trades)}负)")
+            print(f"\n交易总数: {len(pnls)}")
+            print(f"胜率: {win_rate:.1f}% ({len(winning)}胜 / {len(losing)}负)")
             print(f"平均盈利: ${avg_win:.2f}")
             print(f"平均亏损: ${avg_loss:.2f}")
 
@@ -691,17 +944,11 @@ class BacktestEngine:
 
     def _calculate_max_drawdown(self) -> float:
         """计算最大回撤"""
-        if not self.equity_curve:
+        if not len(self.eq_arr):
             return 0.0
 
-        peak = self.equity_curve[0]['equity']
-        max_dd = 0.0
-
-        for point in self.equity_curve:
-            equity = point['equity']
-            if equity > peak:
-                peak = equity
-            dd = (peak - equity) / peak * 100
-            max_dd = max(max_dd, dd)
-
-        return max_dd
+        equity = self.eq_arr
+        peaks = np.maximum.accumulate(equity)
+        # 峰值为0的区间不计回撤
+        drawdowns = np.where(peaks > 0, (peaks - equity) / np.where(peaks > 0, peaks, 1), 0.0)
+        return max(0.0, float(drawdowns.max()) * 100)
@@ -0,0 +1,56 @@
+"""
+K线本地缓存
+
+只保存已收盘的K线（收盘后不会再变），按 (交易对, 周期) 存成 [high, low, close, open_time] 数组
+内存里保留一份；指定了文件时同时写入 SqliteDict，进程重启后从中恢复
+"""
+import threading
+from typing import Optional
+
+import numpy as np
+from sqlitedict import SqliteDict
+
+
+class KlinesCache:
+    def __init__(self, filename: Optional[str] = None, max_bars: int = 500):
+        """filename 为 None 时只缓存在内存中"""
+        self.max_bars = max_bars
+        self._store = SqliteDict(filename, autocommit=True) if filename else {}
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(pair: str, interval: str) -> str:
+        return f"{pair}-{interval}"
+
+    def get(self, pair: str, interval: str) -> Optional[np.ndarray]:
+        """返回已缓存的收盘K线（按 open_time 升序），没有返回 None"""
+        key = self._key(pair, interval)
+        with self._lock:
+            bars = self._memory.get(key)
+            if bars is None:
+                bars = self._store.get(key)
+                if bars is not None:
+                    self._memory[key] = bars
+        return bars
+
+    def append(self, pair: str, interval: str, bars: np.ndarray):
+        """追加已收盘的K线，按 open_time 去重，只保留最近 max_bars 根"""
+        if len(bars) == 0:
+            return
+
+        key = self._key(pair, interval)
+        with self._lock:
+            cached = self._memory.get(key)
+            if cached is None:
+                cached = self._store.get(key)
+            if cached is not None:
+                bars = np.concatenate([cached, bars])
+            _, first = np.unique(bars[::-1, 3], return_index=True)  # 重复时保留新数据
+            bars = bars[::-1][first][-self.max_bars:]
+            self._memory[key] = bars
+            self._store[key] = bars
+
+    def close(self):
+        if isinstance(self._store, SqliteDict):
+            self._store.close()
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Float, ForeignKey, Integer, String, func, or_, select
+from sqlalchemy import Column, Float, ForeignKey, Index, Integer, String, func, or_, select
 from sqlalchemy.orm import column_property, relationship
 
 from .base import Base
@@ -7,6 +7,7 @@ from .coin import Coin
 
 class Pair(Base):
     __tablename__ = "pairs"
+    __table_args__ = (Index("idx_pairs_from_to", "from_coin_id", "to_coin_id"),)
 
     id = Column(Integer, primary_key=True)
 
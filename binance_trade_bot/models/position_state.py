@@ -1,6 +1,8 @@
-from datetime import datetime
+from typing import List
 
-from sqlalchemy import Boolean, Column, DateTime, Float, String
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, String
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from .base import Base
 
@@ -20,28 +22,35 @@ class PositionState(Base):  # pylint: disable=too-few-public-methods
     atr = Column(Float, nullable=False)
     atr_pct = Column(Float, nullable=False)
     last_atr_update_time = Column(DateTime, nullable=False)
+    # Wilder 平滑 ATR 的增量状态；为空时（旧记录）下次更新全量重算
+    atr_wilder = Column(Float, nullable=True)
+    prev_close = Column(Float, nullable=True)
+    atr_bar_open_time = Column(Integer, nullable=True)  # 已计入的最后一根K线 open_time（毫秒）
+    # 由 ATR / entry_price 推出的止损常量，ATR 更新时重算；为空时（旧记录）使用前补算
+    be_trigger_abs = Column(Float, nullable=True)
+    trail_dist_abs = Column(Float, nullable=True)
+    be_stop_abs = Column(Float, nullable=True)
+    time_stop_at = Column(DateTime, nullable=True)  # entry_time + 最长持仓时间
 
-    def __init__(
-        self,
-        symbol: str,
-        entry_price: float,
-        entry_time: datetime,
-        highest_price: float,
-        stop_price: float,
-        trail_active: bool,
-        atr: float,
-        atr_pct: float,
-        last_atr_update_time: datetime,
-    ):
-        self.symbol = symbol
-        self.entry_price = entry_price
-        self.entry_time = entry_time
-        self.highest_price = highest_price
-        self.stop_price = stop_price
-        self.trail_active = trail_active
-        self.atr = atr
-        self.atr_pct = atr_pct
-        self.last_atr_update_time = last_atr_update_time
+    @classmethod
+    def bulk_upsert(cls, session, rows: List[dict]):
+        """按主键批量插入或更新（SQLite/PostgreSQL 用一条 INSERT ... ON CONFLICT DO UPDATE，其他数据库逐行 merge）"""
+        if not rows:
+            return
+        insert = _UPSERT_INSERTS.get(session.get_bind().dialect.name)
+        if insert is None:
+            for row in rows:
+                session.merge(cls(**row))
+            return
+        stmt = insert(cls.__table__).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[cls.symbol],
+            set_={column.name: stmt.excluded[column.name] for column in cls.__table__.columns if not column.primary_key},
+        )
+        session.execute(stmt)
+
+    def to_row(self) -> dict:
+        return {column.name: getattr(self, column.name) for column in self.__table__.columns}
 
     def info(self):
         return {
@@ -55,3 +64,10 @@ class PositionState(Base):  # pylint: disable=too-few-public-methods
             "atr_pct": self.atr_pct,
             "last_atr_update_time": self.last_atr_update_time.isoformat(),
         }
+
+
+# 支持 ON CONFLICT DO UPDATE 的方言
+_UPSERT_INSERTS = {
+    "sqlite": sqlite_insert,
+    "postgresql": postgresql_insert,
+}
@@ -20,7 +20,7 @@ class ScoutHistory(Base):
     current_coin_price = Column(Float)
     other_coin_price = Column(Float)
 
-    datetime = Column(DateTime)
+    datetime = Column(DateTime, index=True)
 
     def __init__(
         self,
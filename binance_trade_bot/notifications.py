@@ -7,29 +7,58 @@ import smtplib
 import ssl
 import socket
 import threading
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import time
+from email.message import EmailMessage
 from datetime import datetime
-from os import path
+import os
 import configparser
 
+# 已解析的配置：{(路径, 修改时间): ConfigParser}，文件修改后自动失效
+_CONFIG_CACHE = {}
+
 
 class NotificationHandler:
+    # 字段固定，不需要实例 __dict__
+    __slots__ = (
+        'enabled', 'smtp_server', 'smtp_port', 'sender_email', 'password', 'receiver_email', 'use_tls',
+        'queue', '_from_header', '_smtp', '_smtp_last_used', '_smtp_lock', '_dropped',
+    )
+
+    # 连接空闲超过该秒数后直接重建（服务器通常会断开长时间空闲的连接）
+    SMTP_IDLE_TIMEOUT = 100
+    # 每批最多连续发送的消息数
+    BATCH_SIZE = 32
+    # 队列上限，SMTP 长时间不可用时丢弃最旧的消息，避免内存无限增长
+    QUEUE_MAXSIZE = 256
+    # 一批积压超过该条数时合并成一封摘要邮件
+    DIGEST_THRESHOLD = 8
+
     def __init__(self, enabled=True):
         self.enabled = False
+        # 复用的 SMTP 连接，只在发送线程中使用
+        self._smtp = None
+        self._smtp_last_used = 0.0
+        self._smtp_lock = threading.Lock()
+        self._dropped = 0
 
         if not enabled:
             return
 
         # 尝试从 config/email.ini 读取配置
         config_path = "config/email.ini"
-        if not path.exists(config_path):
+        try:
+            config_stat = os.stat(config_path)
+        except OSError:
             print(f"邮件通知未启用: 配置文件不存在 {config_path}")
             return
 
         try:
-            config = configparser.ConfigParser()
-            config.read(config_path)
+            cache_key = (config_path, config_stat.st_mtime_ns)
+            config = _CONFIG_CACHE.get(cache_key)
+            if config is None:
+                config = configparser.ConfigParser()
+                config.read(config_path)
+                _CONFIG_CACHE[cache_key] = config
 
             self.smtp_server = config.get('smtp', 'server')
             self.smtp_port = config.getint('smtp', 'port')
@@ -38,107 +67,157 @@ class NotificationHandler:
             self.receiver_email = config.get('smtp', 'receiver')
             # 新增：支持 STARTTLS 模式
             self.use_tls = config.getboolean('smtp', 'use_tls', fallback=False)
+            # 发件人/收件人固定，只需格式化一次
+            self._from_header = f"Binance Trade Bot <{self.sender_email}>"
 
             # 测试连接
             self._test_connection()
 
             # 创建发送队列
-            self.queue = queue.Queue()
+            self.queue = queue.Queue(maxsize=self.QUEUE_MAXSIZE)
             self.start_worker()
             self.enabled = True
 
             mode = "STARTTLS" if self.use_tls else "SSL"
             print(f"✓ 邮件通知已启用: {self.receiver_email} ({mode})")
 
-        except smtplib.SMTPAuthenticationError:
-            print(f"邮件通知配置失败: 密码错误（请检查授权码）")
-            self.enabled = False
-        except socket.timeout:
-            print(f"邮件通知配置失败: 连接超时（网络不稳定）")
-            self.enabled = False
-        except smtplib.SMTPServerDisconnected:
-            print(f"邮件通知配置失败: 服务器断开（可能是反垃圾策略）")
-            self.enabled = False
-        except ssl.SSLError as e:
-            print(f"邮件通知配置失败: TLS 错误 - {e}")
-            self.enabled = False
-        except socket.gaierror as e:
-            print(f"邮件通知配置失败: DNS 解析失败 - {e}")
-            self.enabled = False
-        except Exception as e:
+        except (smtplib.SMTPException, OSError, configparser.Error, ValueError) as e:
+            # 认证失败、超时、TLS/DNS 错误、配置缺项都无法恢复，直接不启用
             print(f"邮件通知配置失败: {type(e).__name__} - {e}")
             self.enabled = False
 
     def _test_connection(self):
-        """测试 SMTP 连接"""
+        """测试 SMTP 连接（成功的连接留给后续发送复用）"""
+        with self._smtp_lock:
+            self._close_conn()
+            self._smtp = self._connect(timeout=10)
+            self._smtp_last_used = time.monotonic()
+
+    def _connect(self, timeout):
+        """建立并登录一个新的 SMTP 连接"""
         if self.use_tls:
-            # 使用 STARTTLS (通常是端口 587)
-            with smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=10) as server:
-                server.starttls()
-                server.login(self.sender_email, self.password)
-                # context manager 会自动调用 close()
-                # 不使用 quit()，避免等待服务器响应导致超时
+            # 使用 STARTTLS (通常是端口 587) - 在 TUN 代理下更稳定
+            server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=timeout)
+            server.starttls()
         else:
             # 使用 SSL (通常是端口 465)
             context = ssl.create_default_context()
-            with smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, context=context, timeout=10) as server:
-                server.login(self.sender_email, self.password)
+            server = smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, context=context, timeout=timeout)
+        try:
+            # SMTP 命令都是小包，关闭 Nagle 避免与延迟 ACK 叠加造成的停顿
+            # （starttls 会替换 socket，所以在它之后设置）
+            if hasattr(socket, 'TCP_NODELAY') and server.sock is not None:
+                server.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            server.login(self.sender_email, self.password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _get_conn(self):
+        """返回可用的 SMTP 连接，空闲过久或 NOOP 失败时重建"""
+        server = self._smtp
+        if server is not None and time.monotonic() - self._smtp_last_used < self.SMTP_IDLE_TIMEOUT:
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except (smtplib.SMTPException, OSError):
+                pass
+
+        self._close_conn()
+        self._smtp = self._connect(timeout=15)
+        return self._smtp
+
+    def _close_conn(self):
+        """关闭复用的连接（不使用 quit()，避免等待服务器响应导致超时）"""
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.close()
+        except Exception:
+            pass
+        self._smtp = None
 
     def start_worker(self):
         """启动异步发送线程"""
         threading.Thread(target=self.process_queue, daemon=True).start()
 
     def process_queue(self):
-        """处理发送队列"""
-        import time
+        """处理发送队列：积压的消息一次取出，在同一个连接上连续发送"""
         while True:
-            message = self.queue.get()
+            messages = [self.queue.get()]
+            while len(messages) < self.BATCH_SIZE:
+                try:
+                    messages.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            if len(messages) > self.DIGEST_THRESHOLD:
+                separator = "\n\n" + "-" * 40 + "\n\n"
+                pending = [f"积压 {len(messages)} 条通知，合并发送" + separator + separator.join(messages)]
+            else:
+                pending = list(messages)
             try:
-                self._send_email(message)
+                self._send_batch(pending)
                 # 成功后等待1秒，避免频率限制
                 time.sleep(1)
             except Exception as e:
-                # 失败后等待更长时间再重试
+                # 失败后等待更长时间再重试未发出的消息
                 try:
                     time.sleep(3)
-                    self._send_email(message)
+                    self._send_batch(pending)
                     time.sleep(1)
                 except Exception as retry_error:
                     # 静默失败，不影响其他消息
                     pass
             finally:
-                self.queue.task_done()
+                for _ in messages:
+                    self.queue.task_done()
+
+    def _build_message(self, message):
+        """创建邮件（纯文本，不需要 multipart）"""
+        msg = EmailMessage()
+        msg['From'] = self._from_header
+        msg['To'] = self.receiver_email
+        msg['Subject'] = f"[Binance Bot] {datetime.now().strftime('%H:%M:%S')}"
+        msg.set_content(message, charset='utf-8')
+        return msg
+
+    def _send_batch(self, messages):
+        """在同一个连接上依次发送，发送成功的消息从列表中移除"""
+        # 复用连接，失败时丢弃连接，重试时会重新建立
+        with self._smtp_lock:
+            server = self._get_conn()
+            try:
+                while messages:
+                    server.send_message(self._build_message(messages[0]))
+                    messages.pop(0)
+            except Exception:
+                self._close_conn()
+                raise
+            self._smtp_last_used = time.monotonic()
 
     def _send_email(self, message):
         """实际发送邮件"""
-        try:
-            # 创建邮件
-            msg = MIMEMultipart()
-            msg['From'] = f"Binance Trade Bot <{self.sender_email}>"
-            msg['To'] = self.receiver_email
-            msg['Subject'] = f"[Binance Bot] {datetime.now().strftime('%H:%M:%S')}"
-
-            msg.attach(MIMEText(message, 'plain', 'utf-8'))
-
-            # 发送
-            if self.use_tls:
-                # STARTTLS 模式 - 在 TUN 代理下更稳定
-                with smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=15) as server:
-                    server.starttls()
-                    server.login(self.sender_email, self.password)
-                    server.send_message(msg)
-            else:
-                # SSL 模式
-                context = ssl.create_default_context()
-                with smtplib.SMTP_SSL(self.smtp_server, self.smtp_port, context=context, timeout=15) as server:
-                    server.login(self.sender_email, self.password)
-                    server.send_message(msg)
-        except Exception as e:
-            # 重新抛出异常，让上层处理重试
-            raise e
+        self._send_batch([message])
 
     def send_notification(self, message, attachments=None):
         """发送通知（保持接口兼容）"""
         if self.enabled:
             # 忽略 attachments 参数（暂不支持附件）
-            self.queue.put(message)
+            try:
+                self.queue.put_nowait(message)
+            except queue.Full:
+                # 队列已满：丢弃最旧的一条，保留最新状态
+                try:
+                    self.queue.get_nowait()
+                    self.queue.task_done()
+                except queue.Empty:
+                    pass
+                try:
+                    self.queue.put_nowait(message)
+                except queue.Full:
+                    pass
+                self._dropped += 1
+                if self._dropped % 100 == 1:
+                    print(f"邮件通知队列已满，已丢弃 {self._dropped} 条旧消息")
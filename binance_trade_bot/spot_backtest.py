@@ -8,13 +8,18 @@
 
 关键设计：
 - 用 yfinance 一次性下载所有数据（不分批）
-- 数据缓存到本地（pickle）
+- 数据缓存到本地（numpy .npz）
 - 模拟 Binance 现货交易 API
 """
+import json
 import os
 import pickle
-from datetime import datetime, timedelta
-from typing import Dict, Optional
+from collections.abc import MutableMapping
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, List, Optional
+import numpy as np
 import pandas as pd
 import yfinance as yf
 
@@ -23,6 +28,26 @@ from binance_trade_bot.database import Database
 from binance_trade_bot.logger import Logger
 from binance_trade_bot.config import Config
 
+# K线周期 -> 毫秒
+_INTERVAL_MS = {
+    '1m': 60 * 1000,
+    '3m': 3 * 60 * 1000,
+    '5m': 5 * 60 * 1000,
+    '15m': 15 * 60 * 1000,
+    '30m': 30 * 60 * 1000,
+    '1h': 60 * 60 * 1000,
+    '2h': 2 * 60 * 60 * 1000,
+    '4h': 4 * 60 * 60 * 1000,
+    '1d': 24 * 60 * 60 * 1000,
+}
+
+
+@lru_cache(maxsize=4096)
+def _parse_bn_time(time_str: str) -> int:
+    """Binance 风格时间字符串转毫秒时间戳（策略反复传入相同字符串，结果缓存）"""
+    return int(datetime.strptime(time_str, "%d %b %Y %H:%M:%S").timestamp() * 1000)
+
+
 # ========================================
 # 数据加载器（用 yfinance）
 # ========================================
@@ -33,9 +58,12 @@ class DataLoader:
     简单、稳定、免费
     """
 
+    BASE_INTERVAL_MS = _INTERVAL_MS['5m']  # yfinance 下载的K线周期
+
     def __init__(self, cache_dir='./backtest_data'):
         self.cache_dir = cache_dir
-        self.data_cache = {}  # {symbol: DataFrame}
+        self.data_cache = {}  # {symbol: {'ts': int64 毫秒数组, 'open'/'high'/'low'/'close'/'volume': float64 数组}}
+        self.klines = {}  # {(symbol, interval_ms): K线数组}
         os.makedirs(cache_dir, exist_ok=True)
 
     def get_price(self, symbol: str, timestamp_ms: int) -> Optional[float]:
@@ -50,25 +78,63 @@ class DataLoader:
             价格（close价格），如果找不到返回 None
         """
         # 确保数据已加载
-        if symbol not in self.data_cache:
+        data = self.data_cache.get(symbol)
+        if data is None:
             return None
 
-        df = self.data_cache[symbol]
+        # 找到 <= timestamp_ms 的最近一条数据（向前查找，不能用未来数据）
+        i = int(np.searchsorted(data['ts'], timestamp_ms, side='right')) - 1
+        if i < 0:
+            return None
+        return float(data['close'][i])
 
-        # 转换时间戳为 datetime
-        target_time = pd.to_datetime(timestamp_ms, unit='ms')
+    def get_prices(self, symbol: str, timestamps_ms: np.ndarray) -> np.ndarray:
+        """
+        get_price 的批量版本，找不到的位置填 NaN
+        """
+        out = np.full(len(timestamps_ms), np.nan)
+        data = self.data_cache.get(symbol)
+        if data is None:
+            return out
 
-        # 找到最接近的价格（向前查找，不能用未来数据）
-        # 使用 asof 方法：找到 <= target_time 的最近一条数据
-        try:
-            price = df['Close'].asof(target_time)
-            return float(price) if pd.notna(price) else None
-        except Exception:
+        idx = np.searchsorted(data['ts'], timestamps_ms, side='right') - 1
+        found = idx >= 0
+        out[found] = data['close'][idx[found]]
+        return out
+
+    def get_kline_arrays(self, symbol: str, interval_ms: int) -> Optional[Dict[str, np.ndarray]]:
+        """
+        返回按 open_time 排序的K线数组（open_time / close_time / OHLCV）
+        原始数据是5分钟K线，更大的周期按 open_time 分桶聚合，结果缓存
+        """
+        key = (symbol, interval_ms)
+        klines = self.klines.get(key)
+        if klines is not None:
+            return klines
+
+        data = self.data_cache.get(symbol)
+        if data is None or interval_ms < self.BASE_INTERVAL_MS or len(data['ts']) == 0:
             return None
 
-    def load_data(self, symbols: list, start_date: str, end_date: str):
+        bucket = data['ts'] // interval_ms * interval_ms
+        starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+        ends = np.r_[starts[1:], len(bucket)]
+        open_time = bucket[starts]
+        klines = {
+            'open_time': open_time,
+            'close_time': open_time + interval_ms - 1,
+            'open': data['open'][starts],
+            'high': np.maximum.reduceat(data['high'], starts),
+            'low': np.minimum.reduceat(data['low'], starts),
+            'close': data['close'][ends - 1],
+            'volume': np.add.reduceat(data['volume'], starts),
+        }
+        self.klines[key] = klines
+        return klines
+
+    def load_data(self, symbols: list, start_date: str, end_date: str, max_workers: int = 8):
         """
-        批量下载并缓存数据
+        批量下载并缓存数据（多个币种并发下载）
 
         Args:
             symbols: 交易对列表，如 ['BNBUSDT', 'SOLUSDT']
@@ -80,46 +146,147 @@ class DataLoader:
         print(f"币种数量: {len(symbols)}")
         print()
 
-        for symbol in symbols:
-            # 转换 Binance 格式到 Yahoo Finance 格式
-            # BNBUSDT -> BNB-USD
-            yf_symbol = self._convert_symbol(symbol)
-
-            cache_file = os.path.join(self.cache_dir, f"{symbol}_5m.pkl")
-
-            # 检查缓存
-            if os.path.exists(cache_file):
-                print(f"✓ {symbol}: 使用缓存")
-                with open(cache_file, 'rb') as f:
-                    self.data_cache[symbol] = pickle.load(f)
+        pending = [symbol for symbol in symbols if symbol not in self.data_cache]
+        if pending:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(self._load_one, symbol, start_date, end_date): symbol
+                           for symbol in pending}
+                for future in as_completed(futures):
+                    symbol = futures[future]
+                    try:
+                        print(future.result())
+                    except Exception as e:
+                        print(f"↓ {symbol}: 失败: {e}")
+
+        loaded = sum(symbol in self.data_cache for symbol in symbols)
+        print(f"\n数据加载完成！成功: {loaded}/{len(symbols)}")
+
+    def _load_one(self, symbol: str, start_date: str, end_date: str) -> str:
+        """加载单个币种（缓存检查 + 补下载 + 保存），返回状态描述"""
+        cache_file = os.path.join(self.cache_dir, f"{symbol}_5m.npz")
+
+        # 检查缓存：只有覆盖范围包含请求区间时才直接使用，否则只补下载缺失的部分
+        if not os.path.exists(cache_file):
+            self._migrate_pickle_cache(symbol, cache_file)
+        arrays, covered = self._read_cache(symbol, cache_file)
+
+        if arrays is None:
+            missing = [(start_date, end_date)]
+        else:
+            missing = []
+            if start_date < covered[0]:
+                missing.append((start_date, covered[0]))
+            if end_date > covered[1]:
+                missing.append((covered[1], end_date))
+            if not missing:
+                self.data_cache[symbol] = arrays
+                return f"✓ {symbol}: 使用缓存"
+
+        # 下载数据
+        downloaded = 0
+        for lo, hi in missing:
+            part = self._download(symbol, lo, hi)
+            if part is None:
                 continue
+            downloaded += len(part['ts'])
+            arrays = part if arrays is None else self._merge_arrays(arrays, part)
 
-            # 下载数据
-            print(f"↓ {symbol}: 下载中...", end='', flush=True)
-            try:
-                df = yf.download(
-                    yf_symbol,
-                    start=start_date,
-                    end=end_date,
-                    interval='5m',
-                    progress=False
-                )
+        if arrays is None:
+            return f"↓ {symbol}: 失败（无数据）"
 
-                if df.empty:
-                    print(f" 失败（无数据）")
-                    continue
+        # 保存缓存
+        if covered is None:
+            covered = (start_date, end_date)
+        else:
+            covered = (min(start_date, covered[0]), max(end_date, covered[1]))
+        self._write_cache(symbol, cache_file, arrays, *covered)
+
+        self.data_cache[symbol] = arrays
+        return f"↓ {symbol}: 成功（新增 {downloaded} 条，共 {len(arrays['ts'])} 条K线）"
+
+    def _download(self, symbol: str, start_date: str, end_date: str) -> Optional[Dict[str, np.ndarray]]:
+        """从 yfinance 下载 [start_date, end_date) 的5分钟K线，无数据返回 None"""
+        # 转换 Binance 格式到 Yahoo Finance 格式
+        # BNBUSDT -> BNB-USD
+        # 用 Ticker.history 而不是 yf.download：后者的结果存在模块级共享字典里，并发调用会互相覆盖
+        df = yf.Ticker(self._convert_symbol(symbol)).history(
+            start=start_date,
+            end=end_date,
+            interval='5m',
+        )
+        if df.empty:
+            return None
+        return self._to_arrays(df)
 
-                # 保存缓存
-                with open(cache_file, 'wb') as f:
-                    pickle.dump(df, f)
+    def _read_cache(self, symbol: str, cache_file: str):
+        """
+        读取本地缓存及其覆盖范围
 
-                self.data_cache[symbol] = df
-                print(f" 成功（{len(df)} 条K线）")
+        Returns:
+            (数组, (开始日期, 结束日期))；没有缓存时返回 (None, None)
+        """
+        if not os.path.exists(cache_file):
+            return None, None
 
-            except Exception as e:
-                print(f" 失败: {e}")
+        with np.load(cache_file, allow_pickle=False) as cached:
+            arrays = {name: cached[name] for name in cached.files}
 
-        print(f"\n数据加载完成！成功: {len(self.data_cache)}/{len(symbols)}")
+        meta_file = os.path.join(self.cache_dir, f"{symbol}_5m.meta.json")
+        try:
+            with open(meta_file) as f:
+                meta = json.load(f)
+            return arrays, (meta['start'], meta['end'])
+        except (OSError, ValueError, KeyError):
+            pass
+
+        # 旧缓存没有元数据：按实际数据的首尾推断
+        if len(arrays['ts']) == 0:
+            return None, None
+        first = datetime.utcfromtimestamp(arrays['ts'][0] / 1000)
+        last = datetime.utcfromtimestamp((arrays['ts'][-1] + self.BASE_INTERVAL_MS) / 1000)
+        return arrays, (first.strftime('%Y-%m-%d'), last.strftime('%Y-%m-%d'))
+
+    def _write_cache(self, symbol: str, cache_file: str, arrays: Dict[str, np.ndarray],
+                     start_date: str, end_date: str):
+        """写入缓存数组和覆盖范围元数据"""
+        np.savez(cache_file, **arrays)
+        meta_file = os.path.join(self.cache_dir, f"{symbol}_5m.meta.json")
+        with open(meta_file, 'w') as f:
+            json.dump({'start': start_date, 'end': end_date, 'rows': len(arrays['ts'])}, f)
+
+    @staticmethod
+    def _merge_arrays(old: Dict[str, np.ndarray], new: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        """合并两段K线数组，按时间排序，重复的时间戳保留新数据"""
+        merged = {name: np.concatenate([new[name], old[name]]) for name in old}
+        _, first = np.unique(merged['ts'], return_index=True)  # 结果已按 ts 排序
+        return {name: values[first] for name, values in merged.items()}
+
+    @staticmethod
+    def _to_arrays(df: pd.DataFrame) -> Dict[str, np.ndarray]:
+        """DataFrame 转为按时间排序的毫秒时间戳 / OHLCV 数组"""
+        columns = {}
+        for name in ('Open', 'High', 'Low', 'Close', 'Volume'):
+            column = df[name]
+            if isinstance(column, pd.DataFrame):  # 新版 yfinance 返回多级列
+                column = column.iloc[:, 0]
+            columns[name.lower()] = column.to_numpy(dtype=np.float64)
+
+        ts = df.index.values.astype('datetime64[ms]').astype(np.int64)
+        valid = ~np.isnan(columns['close'])  # 与 asof 一致：跳过缺失值
+        arrays = {name: values[valid] for name, values in columns.items()}
+        arrays['ts'] = ts[valid]
+        return arrays
+
+    def _migrate_pickle_cache(self, symbol: str, cache_file: str):
+        """把旧版 .pkl 缓存（DataFrame）升级为 .npz"""
+        legacy_file = os.path.join(self.cache_dir, f"{symbol}_5m.pkl")
+        if not os.path.exists(legacy_file):
+            return
+
+        with open(legacy_file, 'rb') as f:
+            df = pickle.load(f)
+        np.savez(cache_file, **self._to_arrays(df))
+        os.remove(legacy_file)
 
     def _convert_symbol(self, binance_symbol: str) -> str:
         """
@@ -136,18 +303,57 @@ class DataLoader:
 # 现货回测API管理器
 # ========================================
 
+class _BalancesView(MutableMapping):
+    """SpotBacktestAPIManager 余额数组的字典视图（写入会同步到数组）"""
+
+    def __init__(self, api: "SpotBacktestAPIManager"):
+        self._api = api
+
+    def __getitem__(self, symbol: str) -> float:
+        return float(self._api._balances_arr[self._api._coin_index[symbol]])
+
+    def __setitem__(self, symbol: str, amount: float):
+        i = self._api._slot(symbol)  # 可能扩容数组，先取下标
+        self._api._balances_arr[i] = amount
+
+    def __delitem__(self, symbol: str):
+        # 余额数组的位置不能删除，清零即可
+        self._api._balances_arr[self._api._coin_index[symbol]] = 0.0
+
+    def __iter__(self):
+        return iter(list(self._api._coin_index))
+
+    def __len__(self) -> int:
+        return len(self._api._coin_index)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
 class SpotBacktestAPIManager:
     """
     模拟 BinanceAPIManager 的现货交易接口
     策略代码无法区分这是回测还是实盘
     """
 
-    def __init__(self, data_loader: DataLoader, initial_balance: float = 10000, bridge_symbol: str = 'USDT'):
+    def __init__(self, data_loader: DataLoader, initial_balance: float = 10000, bridge_symbol: str = 'USDT',
+                 coins: Optional[List[str]] = None, verbose: bool = False):
         self.data_loader = data_loader
+        self.verbose = verbose  # 逐笔打印成交/告警（长周期回测时关闭）
         self.current_time = None  # 回测引擎会设置这个虚拟时间（毫秒）
-        self.balances = {bridge_symbol: initial_balance}  # 账户余额 {symbol: amount}
         self.bridge_symbol = bridge_symbol
+        # 余额按固定顺序存成数组（桥币在下标0），资产估值可以直接做点积
+        self._coin_index = {bridge_symbol: 0}
+        for symbol in coins or ():
+            self._coin_index.setdefault(symbol, len(self._coin_index))
+        self._balances_arr = np.zeros(len(self._coin_index), dtype=np.float64)
+        self._balances_arr[0] = initial_balance
         self.fee_rate = 0.00075  # Binance 现货手续费 0.075%
+        # 同一虚拟时间内价格不变，按 tick 缓存查询结果
+        self._price_memo = {}
+        self._price_memo_time = None
+        self._formatted_klines = {}  # {(symbol, interval_ms): Binance 格式的K线行}
+        self._interval_ms = _INTERVAL_MS['5m']  # 标记价格取最近一根已完成的5分钟K线
 
         # 模拟 binance_client（策略代码会调用）
         self.binance_client = self
@@ -164,62 +370,104 @@ class SpotBacktestAPIManager:
 
         # 转换时间字符串为毫秒时间戳
         if isinstance(start_str, str):
-            start_time = int(datetime.strptime(start_str, "%d %b %Y %H:%M:%S").timestamp() * 1000)
+            start_time = _parse_bn_time(start_str)
         else:
             start_time = int(start_str)
 
         if isinstance(end_str, str):
-            end_time = int(datetime.strptime(end_str, "%d %b %Y %H:%M:%S").timestamp() * 1000)
+            end_time = _parse_bn_time(end_str)
         else:
             end_time = int(end_str)
 
-        # 只返回已完成的K线（close_time < current_time）
-        klines = self.data_loader.get_klines(symbol, interval, start_time, min(end_time, self.current_time))
+        interval_ms = self._interval_to_ms(interval)
+        klines = self.data_loader.get_kline_arrays(symbol, interval_ms)
+        if klines is None:
+            return []
 
-        # 过滤：只返回 close_time < current_time 的K线
-        klines = [k for k in klines if k.close_time < self.current_time]
+        # 只返回已完成的K线（close_time < current_time），且 open_time 落在 [start, end] 内
+        lo = int(np.searchsorted(klines['open_time'], start_time, side='left'))
+        hi = int(np.searchsorted(klines['open_time'], end_time, side='right'))
+        hi = min(hi, int(np.searchsorted(klines['close_time'], self.current_time, side='left')))
 
         # 只返回最后 limit 根
-        klines = klines[-limit:]
-
-        # 转换为Binance API格式
-        return [
-            [
-                k.open_time,
-                str(k.open),
-                str(k.high),
-                str(k.low),
-                str(k.close),
-                str(k.volume),
-                k.close_time,
+        lo = max(lo, hi - limit)
+        if lo >= hi:
+            return []
+
+        # 转换为Binance API格式（整段只格式化一次）
+        rows = self._formatted_klines.get((symbol, interval_ms))
+        if rows is None:
+            rows = [
+                [open_time, str(o), str(h), str(l), str(c), str(v), close_time]
+                for open_time, o, h, l, c, v, close_time in zip(
+                    klines['open_time'].tolist(),
+                    klines['open'].tolist(),
+                    klines['high'].tolist(),
+                    klines['low'].tolist(),
+                    klines['close'].tolist(),
+                    klines['volume'].tolist(),
+                    klines['close_time'].tolist(),
+                )
             ]
-            for k in klines
-        ]
+            self._formatted_klines[(symbol, interval_ms)] = rows
+        return rows[lo:hi]
 
     def get_ticker_price(self, ticker_symbol: str) -> Optional[float]:
         """
         获取当前标记价格
         ticker_symbol 格式：'BNBUSDT'
         """
+        if self._price_memo_time != self.current_time:
+            self._price_memo.clear()
+            self._price_memo_time = self.current_time
+        if ticker_symbol in self._price_memo:
+            return self._price_memo[ticker_symbol]
+
         try:
-            # 获取当前时间点的最近1根K线的收盘价
-            interval_ms = 5 * 60 * 1000  # 5分钟
+            # 获取当前时间点之前最近一根已完成5分钟K线的收盘价
+            interval_ms = self._interval_ms
             current_interval_start = (self.current_time // interval_ms) * interval_ms
-            end_time = current_interval_start
-
-            klines = self.data_loader.get_klines(ticker_symbol, '5m', end_time - interval_ms, end_time)
-
-            if klines and klines[-1].close_time < self.current_time:
-                return klines[-1].close
-
-            return None
+            price = self.data_loader.get_price(ticker_symbol, current_interval_start - interval_ms)
         except Exception as e:
-            print(f"Failed to get ticker price for {ticker_symbol}: {e}")
-            return None
+            if self.verbose:
+                print(f"Failed to get ticker price for {ticker_symbol}: {e}")
+            price = None
+
+        self._price_memo[ticker_symbol] = price
+        return price
+
+    @property
+    def balances(self) -> "_BalancesView":
+        """账户余额 {symbol: amount}，读写都直接作用于余额数组"""
+        return _BalancesView(self)
+
+    def _slot(self, symbol: str) -> int:
+        """返回币种在余额数组中的下标，未登记的币种追加到末尾"""
+        i = self._coin_index.get(symbol)
+        if i is None:
+            i = self._coin_index[symbol] = len(self._coin_index)
+            self._balances_arr = np.append(self._balances_arr, 0.0)
+        return i
+
+    def price_matrix(self, timestamps: List[int]) -> np.ndarray:
+        """
+        预先计算每个时间点、每个已登记币种的价格（与 get_ticker_price 口径一致）
+        形状为 (len(timestamps), 币种数 - 1)，列顺序与余额数组下标 1.. 对应，缺失价格记为 0
+        """
+        interval_ms = self._interval_ms
+        ts = np.asarray(timestamps, dtype=np.int64)
+        lookup_ts = (ts // interval_ms) * interval_ms - interval_ms
+
+        symbols = sorted(self._coin_index, key=self._coin_index.get)[1:]
+        matrix = np.zeros((len(ts), len(symbols)), dtype=np.float64)
+        for j, symbol in enumerate(symbols):
+            matrix[:, j] = self.data_loader.get_prices(symbol + self.bridge_symbol, lookup_ts)
+        return np.nan_to_num(matrix, nan=0.0)
 
     def get_currency_balance(self, currency_symbol: str, force=False) -> float:
         """返回指定币种的余额"""
-        return self.balances.get(currency_symbol, 0.0)
+        i = self._coin_index.get(currency_symbol)
+        return 0.0 if i is None else float(self._balances_arr[i])
 
     def get_fee(self, origin_coin: Coin, target_coin: Coin, selling: bool) -> float:
         """返回交易手续费率"""
@@ -242,25 +490,29 @@ class SpotBacktestAPIManager:
         price = self.get_ticker_price(ticker_symbol)
 
         if price is None:
-            print(f"⚠️  无法获取 {ticker_symbol} 价格")
+            if self.verbose:
+                print(f"⚠️  无法获取 {ticker_symbol} 价格")
             return None
 
         # 获取 target_coin 余额
         target_balance = self.get_currency_balance(target_symbol)
 
         if target_balance <= 0:
-            print(f"⚠️  {target_symbol} 余额不足: {target_balance}")
+            if self.verbose:
+                print(f"⚠️  {target_symbol} 余额不足: {target_balance}")
             return None
 
         # 计算能买多少 origin_coin（扣除手续费）
         fee = self.get_fee(origin_coin, target_coin, False)
         origin_quantity = (target_balance / price) * (1 - fee)
 
-        # 更新余额
-        self.balances[target_symbol] = 0.0
-        self.balances[origin_symbol] = self.balances.get(origin_symbol, 0.0) + origin_quantity
+        # 更新余额（_slot 可能扩容数组，先取下标再写）
+        src, dst = self._slot(target_symbol), self._slot(origin_symbol)
+        self._balances_arr[src] = 0.0
+        self._balances_arr[dst] += origin_quantity
 
-        print(f"✅ 买入: {origin_quantity:.8f} {origin_symbol} @ {price:.8f} (花费 {target_balance:.2f} {target_symbol})")
+        if self.verbose:
+            print(f"✅ 买入: {origin_quantity:.8f} {origin_symbol} @ {price:.8f} (花费 {target_balance:.2f} {target_symbol})")
 
         # 返回模拟的订单对象
         class MockOrder:
@@ -282,42 +534,35 @@ class SpotBacktestAPIManager:
         price = self.get_ticker_price(ticker_symbol)
 
         if price is None:
-            print(f"⚠️  无法获取 {ticker_symbol} 价格")
+            if self.verbose:
+                print(f"⚠️  无法获取 {ticker_symbol} 价格")
             return None
 
         # 获取 origin_coin 余额
         origin_balance = self.get_currency_balance(origin_symbol)
 
         if origin_balance <= 0:
-            print(f"⚠️  {origin_symbol} 余额不足: {origin_balance}")
+            if self.verbose:
+                print(f"⚠️  {origin_symbol} 余额不足: {origin_balance}")
             return None
 
         # 计算能换回多少 target_coin（扣除手续费）
         fee = self.get_fee(origin_coin, target_coin, True)
         target_quantity = (origin_balance * price) * (1 - fee)
 
-        # 更新余额
-        self.balances[origin_symbol] = 0.0
-        self.balances[target_symbol] = self.balances.get(target_symbol, 0.0) + target_quantity
+        # 更新余额（_slot 可能扩容数组，先取下标再写）
+        src, dst = self._slot(origin_symbol), self._slot(target_symbol)
+        self._balances_arr[src] = 0.0
+        self._balances_arr[dst] += target_quantity
 
-        print(f"✅ 卖出: {origin_balance:.8f} {origin_symbol} @ {price:.8f} (换回 {target_quantity:.2f} {target_symbol})")
+        if self.verbose:
+            print(f"✅ 卖出: {origin_balance:.8f} {origin_symbol} @ {price:.8f} (换回 {target_quantity:.2f} {target_symbol})")
 
         return {"price": price}
 
     def _interval_to_ms(self, interval: str) -> int:
         """K线周期转毫秒"""
-        mapping = {
-            '1m': 60 * 1000,
-            '3m': 3 * 60 * 1000,
-            '5m': 5 * 60 * 1000,
-            '15m': 15 * 60 * 1000,
-            '30m': 30 * 60 * 1000,
-            '1h': 60 * 60 * 1000,
-            '2h': 2 * 60 * 60 * 1000,
-            '4h': 4 * 60 * 60 * 1000,
-            '1d': 24 * 60 * 60 * 1000,
-        }
-        return mapping.get(interval, 60 * 1000)
+        return _INTERVAL_MS.get(interval, 60 * 1000)
 
 
 # ========================================
@@ -357,11 +602,29 @@ class SpotBacktestEngine:
     4. 记录和统计结果
     """
 
-    def __init__(self, strategy_class, config, binance_client=None):
+    def __init__(self, strategy_class, config, binance_client=None, verbose: bool = False):
         self.strategy_class = strategy_class
         self.config = config
-        self.data_loader = DataLoader(binance_client=binance_client)
-        self.balance_history = []  # 资金曲线
+        self.verbose = verbose
+        # 现货数据来自 yfinance，binance_client 仅为兼容旧脚本保留
+        self.data_loader = DataLoader()
+        # 资金曲线：时间戳 / 总资产 / 各币种余额（列顺序见 coin_symbols）
+        self.ts_arr = np.empty(0, dtype=np.int64)
+        self.val_arr = np.empty(0, dtype=np.float64)
+        self.bal_mat = np.empty((0, 0), dtype=np.float64)
+        self.coin_symbols = []
+
+    @property
+    def balance_history(self) -> List[Dict]:
+        """按需把资金曲线展开成字典列表"""
+        return [
+            {
+                'timestamp': ts,
+                'total_value': value,
+                'balances': dict(zip(self.coin_symbols, row)),
+            }
+            for ts, value, row in zip(self.ts_arr.tolist(), self.val_arr.tolist(), self.bal_mat.tolist())
+        ]
 
     def run(self, start_date: str, end_date: str, initial_balance: float = 10000,
             interval: str = '5m'):
@@ -386,7 +649,9 @@ class SpotBacktestEngine:
         spot_api = SpotBacktestAPIManager(
             data_loader=self.data_loader,
             initial_balance=initial_balance,
-            bridge_symbol=self.config.BRIDGE.symbol
+            bridge_symbol=self.config.BRIDGE.symbol,
+            coins=self.config.SUPPORTED_COIN_LIST,
+            verbose=self.verbose,
         )
 
         # 2. 创建策略实例（依赖注入）
@@ -404,6 +669,16 @@ class SpotBacktestEngine:
         if len(timestamps) == 0:
             raise ValueError("时间范围无效，无法生成时间戳序列")
 
+        # 预加载所有币种的K线到内存数组
+        bridge = self.config.BRIDGE.symbol
+        self.data_loader.load_data(
+            [coin + bridge for coin in self.config.SUPPORTED_COIN_LIST if coin != bridge],
+            start_date, end_date
+        )
+
+        # 按时间序列对齐的价格矩阵，资产估值直接按下标取行
+        prices = spot_api.price_matrix(timestamps)
+
         # 4. 设置初始时间（策略初始化需要）
         spot_api.current_time = timestamps[0]
 
@@ -423,13 +698,24 @@ class SpotBacktestEngine:
         error_count = 0
         max_errors = max(10, len(timestamps) // 10)  # 最多允许10%的周期失败
 
+        n = len(timestamps)
+        ts_arr = np.empty(n, dtype=np.int64)
+        val_arr = np.empty(n, dtype=np.float64)
+        bal_mat = np.zeros((n, len(spot_api._balances_arr)), dtype=np.float64)
+        recorded = 0  # 出错的周期不记录资金曲线
+
+        # 循环内用到的属性/方法先绑定为局部变量
+        scout = strategy.scout
+        n_priced = prices.shape[1]
+        progress_step = max(1, n // 10)  # 进度显示（每10%）
+
         for i, ts in enumerate(timestamps):
             # 设置当前虚拟时间
             spot_api.current_time = ts
 
             # 调用策略
             try:
-                strategy.scout()
+                scout()
             except Exception as e:
                 error_count += 1
                 print(f"❌ Strategy error at {self._ts_to_str(ts)}: {e}")
@@ -441,21 +727,29 @@ class SpotBacktestEngine:
                     )
                 continue
 
-            # 记录资金曲线
-            total_value = self._calculate_total_value(spot_api)
+            # 记录资金曲线（币种都在价格矩阵里时直接点积）
+            balances = spot_api._balances_arr
+            if len(balances) == n_priced + 1:
+                total_value = float(balances[0] + np.dot(balances[1:], prices[i]))
+            else:
+                total_value = self._calculate_total_value(spot_api, prices[i])
+                if len(balances) > bal_mat.shape[1]:  # 中途出现新币种，补列
+                    bal_mat = np.pad(bal_mat, ((0, 0), (0, len(balances) - bal_mat.shape[1])))
 
-            self.balance_history.append({
-                'timestamp': ts,
-                'total_value': total_value,
-                'balances': dict(spot_api.balances),
-            })
+            ts_arr[recorded] = ts
+            val_arr[recorded] = total_value
+            bal_mat[recorded, :len(balances)] = balances
+            recorded += 1
 
-            # 进度显示（每10%或至少每100个周期）
-            progress_step = max(1, len(timestamps) // 10)
             if (i + 1) % progress_step == 0:
-                progress = (i + 1) / len(timestamps) * 100
+                progress = (i + 1) / n * 100
                 print(f"⏳ 进度: {progress:.0f}% | 总资产: ${total_value:.2f}")
 
+        self.ts_arr = ts_arr[:recorded]
+        self.val_arr = val_arr[:recorded]
+        self.bal_mat = bal_mat[:recorded]
+        self.coin_symbols = sorted(spot_api._coin_index, key=spot_api._coin_index.get)
+
         # 5. 输出统计
         if error_count > 0:
             print(f"\n⚠️  警告：回测过程中发生 {error_count} 次错误")
@@ -464,49 +758,30 @@ class SpotBacktestEngine:
 
         return spot_api
 
-    def _calculate_total_value(self, api: SpotBacktestAPIManager) -> float:
+    def _calculate_total_value(self, api: SpotBacktestAPIManager, prices: np.ndarray) -> float:
         """计算总资产价值（折算为USDT）"""
-        total = 0.0
-
-        for symbol, balance in api.balances.items():
-            if balance == 0:
-                continue
-
-            if symbol == api.bridge_symbol:
-                total += balance
-            else:
-                # 获取价格并折算
-                ticker_symbol = symbol + api.bridge_symbol
-                price = api.get_ticker_price(ticker_symbol)
+        balances = api._balances_arr
+        n = len(prices)
+        total = balances[0] + np.dot(balances[1:n + 1], prices)
+
+        # 回测中途才出现的币种不在价格矩阵里，逐个查询
+        if len(balances) > n + 1:
+            for symbol, i in api._coin_index.items():
+                if i <= n or balances[i] == 0:
+                    continue
+                price = api.get_ticker_price(symbol + api.bridge_symbol)
                 if price:
-                    total += balance * price
+                    total += balances[i] * price
 
-        return total
+        return float(total)
 
     def _generate_timestamps(self, start_date: str, end_date: str, interval: str) -> List[int]:
         """生成时间戳序列"""
-        start = datetime.strptime(start_date, '%Y-%m-%d')
-        end = datetime.strptime(end_date, '%Y-%m-%d')
-
-        interval_mapping = {
-            '1m': timedelta(minutes=1),
-            '5m': timedelta(minutes=5),
-            '15m': timedelta(minutes=15),
-            '1h': timedelta(hours=1),
-            '4h': timedelta(hours=4),
-            '1d': timedelta(days=1),
-        }
-
-        interval_delta = interval_mapping.get(interval, timedelta(hours=1))
+        start_ms = int(datetime.strptime(start_date, '%Y-%m-%d').timestamp() * 1000)
+        end_ms = int(datetime.strptime(end_date, '%Y-%m-%d').timestamp() * 1000)
 
-        timestamps = []
-        current = start
-
-        while current <= end:
-            timestamps.append(int(current.timestamp() * 1000))
-            current += interval_delta
-
-        return timestamps
+        interval_ms = _INTERVAL_MS.get(interval, 60 * 60 * 1000)
+        return np.arange(start_ms, end_ms + 1, interval_ms, dtype=np.int64).tolist()
 
     def _ts_to_str(self, ts: int) -> str:
         """时间戳转字符串"""
@@ -519,7 +794,7 @@ class SpotBacktestEngine:
         print("=" * 60)
 
         # 基本统计
-        final_value = self.balance_history[-1]['total_value'] if self.balance_history else initial_balance
+        final_value = float(self.val_arr[-1]) if len(self.val_arr) else initial_balance
         total_return = (final_value - initial_balance) / initial_balance * 100
 
         print(f"初始资金: ${initial_balance:.2f}")
@@ -540,17 +815,11 @@ class SpotBacktestEngine:
 
     def _calculate_max_drawdown(self) -> float:
         """计算最大回撤"""
-        if not self.balance_history:
+        if not len(self.val_arr):
             return 0.0
 
-        peak = self.balance_history[0]['total_value']
-        max_dd = 0.0
-
-        for point in self.balance_history:
-            value = point['total_value']
-            if value > peak:
-                peak = value
-            dd = (peak - value) / peak * 100
-            max_dd = max(max_dd, dd)
-
-        return max_dd
+        values = self.val_arr
+        peaks = np.maximum.accumulate(values)
+        # 峰值为0的区间不计回撤
+        drawdowns = np.where(peaks > 0, (peaks - values) / np.where(peaks > 0, peaks, 1), 0.0)
+        return max(0.0, float(drawdowns.max()) * 100)
@@ -1,9 +1,37 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional, List, Tuple
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from binance.client import Client
 
 from binance_trade_bot.auto_trader import AutoTrader
+from binance_trade_bot.klines_cache import KlinesCache
 from binance_trade_bot.models import PositionState
 
+# ATR 周期对应的K线时长
+_TIMEFRAME_DELTA = {
+    "15m": timedelta(minutes=15),
+    "30m": timedelta(minutes=30),
+    "1h": timedelta(hours=1),
+    "2h": timedelta(hours=2),
+    "4h": timedelta(hours=4),
+    "1d": timedelta(days=1),
+}
+
+# should_exit 的返回值
+EXIT_HOLD = 0
+EXIT_STOP = 1
+EXIT_TIME = 2
+
+
+def _coin_symbol(coin) -> str:
+    """Coin 对象或字符串 -> 币种符号"""
+    return coin if isinstance(coin, str) else coin.symbol
+
 
 class Strategy(AutoTrader):
     def initialize(self):
@@ -42,6 +70,7 @@ class Strategy(AutoTrader):
         # 时间止损（可选）
         self.max_hold_hours = 24
         self.time_stop_grace_k = 0.5  # 持仓超过 max_hold_hours 且 pnl < 0.5*ATR（收益不足）就走人
+        self._max_hold_td = timedelta(hours=self.max_hold_hours)
 
         # 成本缓冲（你必须按自己账户改）
         # 简陋但比你现在“完全不算成本”强：保本止损至少覆盖手续费和滑点
@@ -50,6 +79,54 @@ class Strategy(AutoTrader):
         # ATR 更新节奏：别每次 scout 都算一遍
         self.atr_update_interval = timedelta(minutes=30)
 
+        # 桥接币符号在运行期间不变，只解析一次
+        bridge = self.config.BRIDGE
+        self._bridge_symbol = bridge.symbol if hasattr(bridge, "symbol") else str(bridge)
+        self._pair_cache: Dict[str, str] = {}
+
+        # 仓位状态的内存副本（写穿到数据库），重启时从数据库恢复，scout 不必每次查库
+        self._positions: Dict[str, PositionState] = {st.symbol: st for st in self.db.get_position_states()}
+
+        # 只有实盘的 manager 有推送连接；回测（MockBinanceManager 等）没有
+        stream_manager = getattr(self.manager, "stream_manager", None)
+
+        # 已收盘K线的本地缓存（仅实盘），每次只向 Binance 请求缓存之后的新K线
+        # 回测的时间是模拟的，不能和实时K线的缓存混用
+        self.klines_cache = KlinesCache(self._klines_cache_path()) if stream_manager is not None else None
+
+        # K线推送（实盘）：已收盘的K线直接写入缓存，未收盘的最新一根记在 _live_klines
+        self._live_klines: Dict[Tuple[str, str], np.ndarray] = {}
+        if stream_manager is not None:
+            stream_manager.subscribe_klines(
+                [coin + self._bridge_symbol for coin in self.config.SUPPORTED_COIN_LIST if coin != self._bridge_symbol],
+                self.atr_timeframe,
+                self._on_stream_kline,
+            )
+
+        # 本轮 scout 内的 ticker 价格，同一分钟内同一交易对只查一次；每轮 scout 开始时清空
+        self._tick_cache = {}
+
+        # fetch_klines 的短时缓存（按模拟时间计时，回测同样适用）：
+        # {(交易对, 周期, limit, min_bars): (取得时的时间戳, K线)}，超过 max 条时淘汰最久未用的
+        self._klines_ttl_cache = OrderedDict()
+        self._klines_ttl_lock = threading.Lock()
+        self.klines_ttl_max_entries = 64
+
+        # K线接口熔断（与 _klines_ttl_cache 一样按模拟时间计时）：{交易对: (连续失败次数, 下次允许请求的时间戳)}
+        self._breaker: Dict[str, Tuple[int, float]] = {}
+        self._breaker_lock = threading.Lock()  # 预取线程也会读写
+        self.breaker_max_backoff = 300  # 秒
+
+        # 可切换目标币种K线的后台预取（仅实盘；切币后新仓位算 ATR 时缓存已是热的）
+        # 回测不预取：后台线程读到的模拟时间会随主循环变化，而且会产生大量真实 API 请求
+        # 每个预取线程用自己的 Client：requests.Session 不保证线程安全，不能和 scout 线程共用 manager 的
+        self._prefetch_local = threading.local()
+        self._prefetch_executor = ThreadPoolExecutor(
+            max_workers=4, initializer=self._init_prefetch_client
+        ) if stream_manager is not None else None
+        self._prefetch_futures = []
+        self._last_prefetch_time = None
+
         self.logger.info(
             "ATR 风控策略启动："
             f"timeframe={self.atr_timeframe}, ATR({self.atr_period}), "
@@ -57,16 +134,45 @@ class Strategy(AutoTrader):
             f"max_hold={self.max_hold_hours}h"
         )
 
+    def _init_prefetch_client(self):
+        """预取线程的 Client：K线是公开接口，不需要 API key，网络参数与 manager 的 Client 相同"""
+        client = self.manager.binance_client
+        self._prefetch_local.client = Client(
+            requests_params=client._requests_params,
+            tld=client.tld,
+            testnet=client.testnet,
+            ping=False,
+        )
+
+    def _klines_client(self) -> Client:
+        """预取线程用各自的 Client，其余调用用 manager 的"""
+        return getattr(self._prefetch_local, "client", None) or self.manager.binance_client
+
+    def close(self):
+        if self._prefetch_executor is not None:
+            self._prefetch_executor.shutdown(wait=False, cancel_futures=True)
+        if self.klines_cache is not None:
+            self.klines_cache.close()
+
     # ---------------------------
     # 工具函数
     # ---------------------------
+    def _klines_cache_path(self) -> Optional[str]:
+        """K线缓存文件放在 SQLite 数据库文件旁边；不是文件型 SQLite 时只缓存在内存"""
+        url = self.db.engine.url
+        if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+            return None
+        return os.path.join(os.path.dirname(url.database), "klines_cache.db")
+
     def make_pair(self, coin) -> str:
         """
         统一处理交易对拼接，不管 coin 是对象还是字符串
         """
-        base = coin.symbol if hasattr(coin, "symbol") else str(coin)
-        bridge = self.config.BRIDGE.symbol if hasattr(self.config.BRIDGE, "symbol") else str(self.config.BRIDGE)
-        return base + bridge
+        symbol = _coin_symbol(coin)
+        pair = self._pair_cache.get(symbol)
+        if pair is None:
+            pair = self._pair_cache[symbol] = symbol + self._bridge_symbol
+        return pair
 
     def extract_real_entry_info(self, order) -> Optional[Tuple[float, datetime]]:
         """
@@ -111,101 +217,279 @@ class Strategy(AutoTrader):
     # ---------------------------
     # 历史K线获取 - 直接用 Binance API，不猜测
     # ---------------------------
-    def fetch_klines(self, coin_pair: str, interval: str, limit: int) -> Optional[List[Tuple[float, float, float]]]:
+    def fetch_klines(self, coin_pair: str, interval: str, limit: int,
+                     min_bars: Optional[int] = None) -> Optional[np.ndarray]:
         """
         直接调用 Binance API 获取历史 K 线数据
-        返回 [(high, low, close), ...] 或 None（失败时）
+        返回形状 (N, 4) 的 [high, low, close, open_time] 数组，或 None（失败时）
+        最后一根是尚未收盘的K线
         """
+        if min_bars is None:
+            min_bars = self.atr_period + 2  # ATR 用 period+1 根已收盘K线，再加一根未收盘的
+        key = (coin_pair, interval, limit, min_bars)
+        now_ts = self.manager.datetime.timestamp()
+        ttl = self._klines_ttl(interval)
+        with self._klines_ttl_lock:
+            hit = self._klines_ttl_cache.get(key)
+            if hit is not None and now_ts - hit[0] < ttl:
+                self._klines_ttl_cache.move_to_end(key)
+                return hit[1]
+
+        with self._breaker_lock:
+            breaker = self._breaker.get(coin_pair)
+        if breaker is not None and now_ts < breaker[1]:
+            return None  # 熔断中，不发请求
+        result = self._fetch_klines(coin_pair, interval, limit, min_bars, now_ts)
+        if result is not None:
+            with self._klines_ttl_lock:
+                self._klines_ttl_cache[key] = (now_ts, result)
+                self._klines_ttl_cache.move_to_end(key)
+                while len(self._klines_ttl_cache) > self.klines_ttl_max_entries:
+                    self._klines_ttl_cache.popitem(last=False)
+        return result
+
+    @staticmethod
+    def _klines_ttl(interval: str) -> float:
+        """K线缓存有效期（秒）：周期的 1/60，最长 5 分钟（1h -> 60s, 4h -> 240s）"""
+        bar_delta = _TIMEFRAME_DELTA.get(interval)
+        if bar_delta is None:
+            return 0.0
+        return min(bar_delta.total_seconds() / 60, 300.0)
+
+    def _fetch_klines(self, coin_pair: str, interval: str, limit: int, min_bars: int,
+                      now_ts: float) -> Optional[np.ndarray]:
         try:
+            params = {"symbol": coin_pair, "interval": interval, "limit": limit}
+
+            # 缓存里已有的收盘K线不再重复下载，只请求之后的K线
+            bar_delta = _TIMEFRAME_DELTA.get(interval)
+            use_cache = bar_delta is not None and self.klines_cache is not None
+            cached = self.klines_cache.get(coin_pair, interval) if use_cache else None
+            if cached is not None and len(cached):
+                bar_ms = bar_delta.total_seconds() * 1000
+                tail = cached[1 - limit:]
+                if np.any(np.diff(tail[:, 3]) != bar_ms):
+                    cached = None  # 中间缺K线（例如推送断线），重新取最近 limit 根
+            if cached is not None and len(cached):
+                next_open = cached[-1, 3] + bar_ms
+                now_ms = now_ts * 1000
+
+                # K线推送已经给出紧接缓存的当前K线：不用请求 REST
+                live = self._live_klines.get((coin_pair, interval))
+                if live is not None and live[3] == next_open and now_ms < next_open + bar_ms \
+                        and len(tail) + 1 >= min_bars:
+                    return np.vstack([tail, live])
+
+                if now_ms - next_open < (limit - 1) * bar_ms:
+                    params["startTime"] = int(next_open)
+                else:
+                    cached = None  # 缓存太旧，直接取最近 limit 根
+
             # Binance API 返回格式：
             # [
             #   [open_time, open, high, low, close, volume, close_time, ...],
             #   ...
             # ]
-            klines = self.manager.binance_client.get_klines(
-                symbol=coin_pair,
-                interval=interval,
-                limit=limit
-            )
+            client = self._klines_client()
+            klines = client.get_klines(**params)
+            if not klines and "startTime" in params:
+                # 缓存之后一根都没取到（至少应有未收盘的那根），按缓存未命中重新取最近 limit 根
+                del params["startTime"]
+                cached = None
+                klines = client.get_klines(**params)
+            with self._breaker_lock:
+                self._breaker.pop(coin_pair, None)
+
+            # 提取 (high, low, close, open_time)，最后一根是未收盘的K线
+            if klines:
+                # 整行转成定长字符串数组（open_time 等整数也转成字符串），再由 numpy 的 C 循环解析成浮点
+                fresh = np.array(klines)[:, [2, 3, 4, 0]].astype(np.float64)
+            else:
+                fresh = np.empty((0, 4))
+            if use_cache and len(fresh) > 1:
+                self.klines_cache.append(coin_pair, interval, fresh[:-1])
+            if cached is not None and len(fresh) < limit:
+                fresh = np.concatenate([cached[len(fresh) - limit:], fresh.reshape(-1, 4)])
 
-            if not klines or len(klines) < self.atr_period + 1:
+            if len(fresh) < min_bars:
                 self.logger.error(
                     f"K线数据不足: {coin_pair} {interval}, "
-                    f"需要 {self.atr_period + 1} 根，实际 {len(klines) if klines else 0} 根"
+                    f"需要 {min_bars} 根，实际 {len(fresh)} 根"
                 )
                 return None
 
-            # 提取 (high, low, close)
-            result = []
-            for kline in klines:
-                high = float(kline[2])
-                low = float(kline[3])
-                close = float(kline[4])
-                result.append((high, low, close))
-
-            return result
+            return fresh
 
         except Exception as e:
-            self.logger.error(f"获取 K线数据失败 ({coin_pair}, {interval}, {limit}): {e}")
+            # 连续失败按 2^n 秒退避，期间直接跳过该交易对
+            with self._breaker_lock:
+                fail_count = self._breaker.get(coin_pair, (0, 0.0))[0] + 1
+                backoff = min(2 ** fail_count, self.breaker_max_backoff)
+                self._breaker[coin_pair] = (fail_count, now_ts + backoff)
+            self.logger.error(
+                f"获取 K线数据失败 ({coin_pair}, {interval}, {limit}): {e}，"
+                f"连续失败 {fail_count} 次，{backoff} 秒内不再请求"
+            )
             return None
 
+    def _on_stream_kline(self, kline: dict):
+        """K线推送回调（在推送线程中执行）"""
+        row = np.array([
+            float(kline["high_price"]),
+            float(kline["low_price"]),
+            float(kline["close_price"]),
+            float(kline["kline_start_time"]),
+        ])
+        if kline["is_closed"]:
+            self.klines_cache.append(kline["symbol"], kline["interval"], row[np.newaxis])
+        self._live_klines[(kline["symbol"], kline["interval"])] = row
+
+    def get_ticker_price(self, coin_pair: str) -> Optional[float]:
+        """本轮 scout 内缓存的 ticker 价格"""
+        key = ("ticker", coin_pair, self.manager.datetime.replace(second=0, microsecond=0))
+        if key not in self._tick_cache:
+            self._tick_cache[key] = self.manager.get_ticker_price(coin_pair)
+        return self._tick_cache[key]
+
+    def prefetch_klines(self, current_coin, now: Optional[datetime] = None):
+        """
+        每个 ATR 更新周期在后台并发预取一次当前币种可切换目标的K线，不阻塞 scout
+        只在实盘进行；上一轮还没跑完时跳过
+        """
+        if self._prefetch_executor is None or any(not future.done() for future in self._prefetch_futures):
+            return
+        if now is None:
+            now = self.manager.datetime
+        if self._last_prefetch_time is not None and now - self._last_prefetch_time < self.atr_update_interval:
+            return
+        self._last_prefetch_time = now
+
+        self._prefetch_futures = [
+            self._prefetch_executor.submit(
+                self.fetch_klines, self.make_pair(pair.to_coin), self.atr_timeframe, self.atr_lookback
+            )
+            for pair in self.db.get_pairs_from(current_coin)
+        ]
+
     # ---------------------------
     # ATR 计算
     # ---------------------------
-    def compute_atr(self, klines: List[Tuple[float, float, float]], period: int) -> float:
+    def compute_atr(self, klines: np.ndarray, period: int) -> float:
         """
-        简单 ATR（Wilder 平滑也行，但这版够用且不复杂化自虐）
+        Wilder ATR（与 TA-Lib / TradingView 的 ATR 口径一致）：
+        前 period 根 TR 取均值作为起点，之后按 atr = (atr*(period-1) + tr) / period 平滑
+        klines: fetch_klines 返回的数组（只用前三列 high / low / close）
         """
-        trs: List[float] = []
-        prev_close = klines[0][2]
-        for high, low, close in klines[1:]:
-            tr = max(
-                high - low,
-                abs(high - prev_close),
-                abs(low - prev_close),
-            )
-            trs.append(tr)
-            prev_close = close
-
-        if len(trs) < period:
+        if len(klines) < period + 1:
             return 0.0
 
-        # 用最近 period 根 TR 的均值
-        recent = trs[-period:]
-        return sum(recent) / period
+        high, low, close = klines[1:, 0], klines[1:, 1], klines[1:, 2]
+        prev_close = klines[:-1, 2]
+        trs = np.maximum(high - low, np.maximum(np.abs(high - prev_close), np.abs(low - prev_close)))
 
-    def get_atr_info(self, coin_pair: str, current_price: float) -> Tuple[Optional[float], Optional[float]]:
+        # 递推展开成加权和：atr_m = a^m * seed + sum(a^(m-1-k) * tr_k) / period
+        decay = (period - 1) / period
+        seed = trs[:period].mean()
+        rest = trs[period:]
+        weights = decay ** np.arange(len(rest) - 1, -1, -1)
+        atr = float(decay ** len(rest) * seed + np.dot(weights, rest) / period)
+        # 数据里混入 NaN 时按失败处理（调用方会拒绝 atr <= 0）
+        return atr if np.isfinite(atr) else 0.0
+
+    def compute_atr_state(self, coin_pair: str, current_price: float) -> Optional[dict]:
         """
-        返回 (atr, atr_pct)，失败返回 (None, None)
-        不要猜默认值，没数据就明确返回 None
+        全量拉取K线计算 ATR，并给出 Wilder 增量更新的起点
+        返回 PositionState 的 ATR 相关字段，失败返回 None
         """
         klines = self.fetch_klines(coin_pair, self.atr_timeframe, self.atr_lookback)
-        if not klines:
+        if klines is None:
             self.logger.error(f"无法获取 {coin_pair} K线数据，ATR 计算失败")
             self._handle_atr_failure(coin_pair)
-            return None, None
+            return None
 
-        atr = self.compute_atr(klines, self.atr_period)
+        # 只用已收盘的K线：Wilder 状态正好覆盖到 atr_bar_open_time，
+        # 未收盘的那根收盘后由 refresh_atr_incremental 计入（否则会重复计入一次）
+        closed = klines[:-1]
+        atr = self.compute_atr(closed, self.atr_period)
         if atr <= 0:
             self.logger.error(f"{coin_pair} ATR 计算结果异常 (atr={atr})，拒绝使用")
             self._handle_atr_failure(coin_pair)
-            return None, None
+            return None
 
         # ATR 获取成功，重置失败计数器
         self.atr_failure_count = 0
 
         atr_pct = (atr / current_price * 100.0) if current_price > 0 else 0.0
-        return atr, atr_pct
+        # 增量更新从最后一根已收盘的K线之后开始
+        _, _, last_close, last_open_time = closed[-1]
+        return {
+            "atr": atr,
+            "atr_pct": atr_pct,
+            "atr_wilder": atr,
+            "prev_close": float(last_close),
+            "atr_bar_open_time": int(last_open_time),
+        }
+
+    def get_atr_info(self, coin_pair: str, current_price: float) -> Tuple[Optional[float], Optional[float]]:
+        """
+        返回 (atr, atr_pct)，失败返回 (None, None)
+        不要猜默认值，没数据就明确返回 None
+        """
+        state = self.compute_atr_state(coin_pair, current_price)
+        if state is None:
+            return None, None
+        return state["atr"], state["atr_pct"]
+
+    def refresh_atr_incremental(self, st: PositionState, coin_pair: str, current_price: float,
+                                now: Optional[datetime] = None) -> bool:
+        """
+        用新收盘的K线按 Wilder 平滑增量更新 ATR：atr = (atr*(period-1) + tr) / period
+        只拉最近几根K线；没有增量状态、状态过旧或中间漏了K线时返回 False，由调用方全量重算
+        """
+        if st.atr_wilder is None or st.prev_close is None or st.atr_bar_open_time is None:
+            return False
+        bar_delta = _TIMEFRAME_DELTA.get(self.atr_timeframe)
+        if now is None:
+            now = self.manager.datetime
+        if bar_delta is None or now - st.last_atr_update_time > 2 * bar_delta:
+            return False
+
+        klines = self.fetch_klines(coin_pair, self.atr_timeframe, 3, min_bars=2)
+        if klines is None:
+            return False
+
+        closed = klines[:-1]
+        new_bars = closed[closed[:, 3] > st.atr_bar_open_time]
+        if len(new_bars) == 0:
+            return True
+        if new_bars[0, 3] - st.atr_bar_open_time > bar_delta.total_seconds() * 1000:
+            return False  # 漏掉了中间的K线
+
+        period = self.atr_period
+        atr = st.atr_wilder
+        prev_close = st.prev_close
+        for high, low, close, open_time in new_bars.tolist():
+            tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
+            atr = (atr * (period - 1) + tr) / period
+            prev_close = close
+
+        st.atr_wilder = atr
+        st.atr = atr
+        st.atr_pct = (atr / current_price * 100.0) if current_price > 0 else 0.0
+        st.prev_close = prev_close
+        st.atr_bar_open_time = int(open_time)
+        return True
 
     def _handle_atr_failure(self, coin_pair: str):
         """处理 ATR 获取失败：计数并在达到阈值时告警"""
         self.atr_failure_count += 1
 
         if self.atr_failure_count >= self.atr_failure_threshold:
+            now = self.manager.datetime
             # 检查是否需要发送告警（避免刷屏）
             should_alert = (
                 self.last_atr_alert_time is None or
-                self.manager.datetime - self.last_atr_alert_time >= self.atr_alert_interval
+                now - self.last_atr_alert_time >= self.atr_alert_interval
             )
 
             if should_alert:
@@ -215,49 +499,61 @@ class Strategy(AutoTrader):
                     f"请检查：(1) 网络连接 (2) Binance API 状态 (3) API 限频问题。"
                     f"策略将拒绝新建仓位，直到 ATR 恢复正常。"
                 )
-                self.last_atr_alert_time = self.manager.datetime
+                self.last_atr_alert_time = now
 
     # ---------------------------
     # 仓位状态管理
     # ---------------------------
-    def ensure_position_state(self, symbol: str, coin_pair: str, current_price: float) -> Optional[PositionState]:
+    def ensure_position_state(self, symbol: str, coin_pair: str, current_price: float,
+                              now: Optional[datetime] = None) -> Optional[PositionState]:
         """
         获取或创建仓位状态（从数据库）
+        now: 本轮 scout 的时间，不传则读取 manager.datetime
         返回 None 表示无法建仓（ATR 数据缺失或无效）
         """
+        if now is None:
+            now = self.manager.datetime
+
         # 从数据库查询现有仓位
-        st = self.db.get_position_state(symbol)
+        st = self._positions.get(symbol)
 
         if st is not None:
-            # 定期更新 ATR（别每次 scout 都算）
-            if self.manager.datetime - st.last_atr_update_time >= self.atr_update_interval:
-                atr, atr_pct = self.get_atr_info(coin_pair, current_price)
-                if atr is None:
+            # 定期更新 ATR（别每次 scout 都算）：优先增量更新，不行再全量重算
+            if now - st.last_atr_update_time >= self.atr_update_interval:
+                updated = self.refresh_atr_incremental(st, coin_pair, current_price, now)
+                if not updated:
+                    state = self.compute_atr_state(coin_pair, current_price)
+                    if state is not None:
+                        for field, value in state.items():
+                            setattr(st, field, value)
+                        updated = True
+
+                if not updated:
                     self.logger.warning(f"{symbol} ATR 更新失败，保留旧值 ATR={st.atr:.8f}")
                 else:
-                    st.atr = atr
-                    st.atr_pct = atr_pct
-                    st.last_atr_update_time = self.manager.datetime
-                    self.db.save_position_state(st)
-                    self.logger.debug(f"{symbol} ATR 更新: {atr:.8f} ({atr_pct:.2f}%)")
+                    st.last_atr_update_time = now
+                    self.set_stop_constants(st)
+                    self.save_position_state(st)
+                    self.logger.debug(f"{symbol} ATR 更新: {st.atr:.8f} ({st.atr_pct:.2f}%)")
             return st
 
         # 新建仓位状态：使用当前 ticker 价格
         # 注意：真实成交价应该在 transaction_through_bridge 时就已经建仓
         # 如果走到这里，说明是程序重启后首次 scout，使用 ticker fallback
         entry_price = current_price
-        entry_time = self.manager.datetime
+        entry_time = now
 
         self.logger.warning(
             f"⚠️  {symbol} 在数据库中没有仓位记录，使用 ticker 价格 {entry_price:.8f} 建仓 "
             f"(可能是程序重启后首次 scout，或切币逻辑未正确建仓)"
         )
 
-        atr, atr_pct = self.get_atr_info(coin_pair, entry_price)
-        if atr is None or atr <= 0:
+        atr_state = self.compute_atr_state(coin_pair, entry_price)
+        if atr_state is None:
             self.logger.error(f"{symbol} ATR 数据不可用，拒绝建仓")
             return None
 
+        atr, atr_pct = atr_state["atr"], atr_state["atr_pct"]
         stop_price = entry_price - self.k_initial_stop * atr
 
         st = PositionState(
@@ -267,11 +563,11 @@ class Strategy(AutoTrader):
             highest_price=entry_price,
             stop_price=stop_price,
             trail_active=False,
-            atr=atr,
-            atr_pct=atr_pct,
-            last_atr_update_time=self.manager.datetime,
+            last_atr_update_time=now,
+            **atr_state,
         )
-        self.db.save_position_state(st)
+        self.set_stop_constants(st)
+        self.save_position_state(st)
 
         self.logger.info(
             f"🧱 建仓 {symbol}: entry={entry_price:.8f}, ATR={atr:.8f} ({atr_pct:.2f}%), "
@@ -279,8 +575,21 @@ class Strategy(AutoTrader):
         )
         return st
 
+    def set_stop_constants(self, st: PositionState):
+        """ATR 或 entry 变化后重算止损用到的绝对值和时间止损时刻，避免每次 scout 重复计算"""
+        st.be_trigger_abs = self.k_be_trigger * st.atr
+        st.trail_dist_abs = self.k_trail_dist * st.atr
+        st.be_stop_abs = st.entry_price * (1.0 + self.fee_buffer_pct / 100.0)
+        st.time_stop_at = st.entry_time + self._max_hold_td
+
+    def save_position_state(self, st: PositionState):
+        """更新内存中的仓位状态并写入数据库"""
+        self._positions[st.symbol] = st
+        self.db.save_position_state(st)
+
     def clear_position_state(self, symbol: str):
-        """从数据库删除仓位状态"""
+        """从内存和数据库删除仓位状态"""
+        self._positions.pop(symbol, None)
         self.db.delete_position_state(symbol)
 
     # ---------------------------
@@ -291,82 +600,99 @@ class Strategy(AutoTrader):
         更新移动止损状态（有副作用的函数）
         职责：更新 highest_price, stop_price, trail_active
         """
-        state_changed = False
+        if st.trail_dist_abs is None:
+            self.set_stop_constants(st)
+
+        # 最常见的情况：移动止损已激活、价格没创新高、止损也不会上移 -> 什么都不用做
+        if st.trail_active and current_price <= st.highest_price \
+                and st.highest_price - st.trail_dist_abs <= st.stop_price:
+            return
 
         # 更新最高价
-        if current_price > st.highest_price:
+        state_changed = current_price > st.highest_price
+        if state_changed:
             st.highest_price = current_price
-            state_changed = True
 
-        pnl = current_price - st.entry_price
-
-        # 阶段1：盈利达到阈值 -> 激活保本止损
-        be_trigger = self.k_be_trigger * st.atr
-        if (not st.trail_active) and (pnl >= be_trigger):
-            cost_buffer = st.entry_price * (self.fee_buffer_pct / 100.0)
-            be_stop = st.entry_price + cost_buffer
-            if be_stop > st.stop_price:
-                st.stop_price = be_stop
+        # 阶段1：盈利达到阈值 -> 激活保本止损；未达到时直接返回（新仓位的常见情况）
+        if not st.trail_active:
+            pnl = current_price - st.entry_price
+            if pnl < st.be_trigger_abs:
+                if state_changed:
+                    self.save_position_state(st)
+                return
             st.trail_active = True
+            st.stop_price = max(st.stop_price, st.be_stop_abs)
             state_changed = True
             self.logger.info(
-                f"🟦 保本止损激活 {st.symbol}: pnl={pnl:.8f} >= trigger={be_trigger:.8f} ({self.k_be_trigger}*ATR), "
+                f"🟦 保本止损激活 {st.symbol}: pnl={pnl:.8f} >= trigger={st.be_trigger_abs:.8f} ({self.k_be_trigger}*ATR), "
                 f"止损提至 {st.stop_price:.8f} (含成本缓冲 {self.fee_buffer_pct:.2f}%)"
             )
 
         # 阶段2：移动止损（只上移不下移）
-        if st.trail_active:
-            trail_stop = st.highest_price - self.k_trail_dist * st.atr
-            if trail_stop > st.stop_price:
-                st.stop_price = trail_stop
-                state_changed = True
-                self.logger.info(
-                    f"🟩 移动止损上移 {st.symbol}: highest={st.highest_price:.8f}, "
-                    f"止损 -> {st.stop_price:.8f}"
-                )
+        trail_stop = st.highest_price - st.trail_dist_abs
+        if trail_stop > st.stop_price:
+            st.stop_price = trail_stop
+            state_changed = True
+            self.logger.info(
+                f"🟩 移动止损上移 {st.symbol}: highest={st.highest_price:.8f}, "
+                f"止损 -> {st.stop_price:.8f}"
+            )
 
         # 状态有变化，提交到数据库
         if state_changed:
-            self.db.save_position_state(st)
+            self.save_position_state(st)
 
-    def should_exit(self, st: PositionState, current_price: float) -> Optional[str]:
+    def should_exit(self, st: PositionState, current_price: float, now: Optional[datetime] = None) -> int:
         """
         纯函数：只检查是否应该退出，不修改状态
-        返回退出原因字符串，否则 None
+        now: 本轮 scout 的时间，不传则读取 manager.datetime
+        返回 EXIT_HOLD / EXIT_STOP / EXIT_TIME，退出原因的文字由 exit_reason 生成
         """
         # 硬退出：触发止损
         if current_price <= st.stop_price:
-            return f"STOP (price={current_price:.8f} <= stop={st.stop_price:.8f})"
+            return EXIT_STOP
 
         # 时间止损（可选）
-        hold_time = self.manager.datetime - st.entry_time
-        if hold_time >= timedelta(hours=self.max_hold_hours):
-            pnl = current_price - st.entry_price
-            if pnl < self.time_stop_grace_k * st.atr:
-                return f"TIME (持仓{hold_time}，pnl={pnl:.8f} < {self.time_stop_grace_k}*ATR)"
+        if now is None:
+            now = self.manager.datetime
+        time_stop_at = st.time_stop_at or st.entry_time + self._max_hold_td
+        if now >= time_stop_at and current_price - st.entry_price < self.time_stop_grace_k * st.atr:
+            return EXIT_TIME
 
-        return None
+        return EXIT_HOLD
+
+    def exit_reason(self, code: int, st: PositionState, current_price: float, now: datetime) -> str:
+        """退出原因说明（只在真正退出时生成）"""
+        if code == EXIT_STOP:
+            return f"STOP (price={current_price:.8f} <= stop={st.stop_price:.8f})"
+        pnl = current_price - st.entry_price
+        return f"TIME (持仓{now - st.entry_time}，pnl={pnl:.8f} < {self.time_stop_grace_k}*ATR)"
 
     # ---------------------------
     # 交易主循环
     # ---------------------------
     def scout(self):
+        now = self.manager.datetime
+        self._tick_cache.clear()
+
         current_coin = self.db.get_current_coin()
+        self.prefetch_klines(current_coin, now)
         coin_pair = self.make_pair(current_coin)
-        current_price = self.manager.get_ticker_price(coin_pair)
+        current_price = self.get_ticker_price(coin_pair)
 
         # 价格验证：None 或 <= 0 都拒绝
         if current_price is None or current_price <= 0:
             self.logger.warning(f"价格无效: {coin_pair} price={current_price}，跳过本轮")
             return
 
+        coin_symbol = _coin_symbol(current_coin)
         st = self.ensure_position_state(
-            current_coin.symbol if hasattr(current_coin, 'symbol') else str(current_coin),
+            coin_symbol,
             coin_pair,
-            current_price
+            current_price,
+            now,
         )
         if st is None:
-            coin_symbol = current_coin.symbol if hasattr(current_coin, 'symbol') else str(current_coin)
             self.logger.error(
                 f"无法建立 {coin_symbol} 仓位状态（ATR 数据缺失），跳过本轮。"
                 "如果持续出现，请检查 K线接口或网络连接"
@@ -377,9 +703,9 @@ class Strategy(AutoTrader):
         self.update_trailing_stop(st, current_price)
 
         # 再检查是否应该退出
-        reason = self.should_exit(st, current_price)
-        if reason:
-            coin_symbol = current_coin.symbol if hasattr(current_coin, 'symbol') else str(current_coin)
+        exit_code = self.should_exit(st, current_price, now)
+        if exit_code != EXIT_HOLD:
+            reason = self.exit_reason(exit_code, st, current_price, now)
             self.logger.info(f"🧯 退出 {coin_symbol}: {reason}")
             result = self.manager.sell_alt(current_coin, self.config.BRIDGE)
             if result:
@@ -398,12 +724,12 @@ class Strategy(AutoTrader):
 
         if result is not None:
             # 清旧仓位
-            from_symbol = pair.from_coin.symbol if hasattr(pair.from_coin, 'symbol') else str(pair.from_coin)
+            from_symbol = _coin_symbol(pair.from_coin)
             self.clear_position_state(from_symbol)
             self.logger.info(f"已清理 {from_symbol} 仓位状态")
 
             # 立即创建新仓位并持久化
-            to_symbol = pair.to_coin.symbol if hasattr(pair.to_coin, 'symbol') else str(pair.to_coin)
+            to_symbol = _coin_symbol(pair.to_coin)
             to_coin_pair = self.make_pair(pair.to_coin)
 
             # 提取真实成交信息
@@ -411,7 +737,7 @@ class Strategy(AutoTrader):
 
             if real_entry_info:
                 real_price, real_time = real_entry_info
-                ticker_price = self.manager.get_ticker_price(to_coin_pair)
+                ticker_price = self.get_ticker_price(to_coin_pair)
                 ticker_diff_pct = abs(real_price - ticker_price) / ticker_price * 100 if ticker_price > 0 else 0
                 self.logger.info(
                     f"✅ 提取到 {to_symbol} 真实成交信息: price={real_price:.8f}, time={real_time.isoformat()}, "
@@ -419,14 +745,15 @@ class Strategy(AutoTrader):
                 )
 
                 # 获取 ATR 并立即建仓
-                atr, atr_pct = self.get_atr_info(to_coin_pair, real_price)
-                if atr is None or atr <= 0:
+                atr_state = self.compute_atr_state(to_coin_pair, real_price)
+                if atr_state is None:
                     self.logger.error(
                         f"{to_symbol} ATR 数据不可用，无法立即建仓。"
                         f"下轮 scout 将重新尝试（使用 ticker fallback）"
                     )
                 else:
                     # 立即创建并持久化仓位
+                    atr, atr_pct = atr_state["atr"], atr_state["atr_pct"]
                     stop_price = real_price - self.k_initial_stop * atr
                     new_position = PositionState(
                         symbol=to_symbol,
@@ -435,18 +762,18 @@ class Strategy(AutoTrader):
                         highest_price=real_price,
                         stop_price=stop_price,
                         trail_active=False,
-                        atr=atr,
-                        atr_pct=atr_pct,
                         last_atr_update_time=self.manager.datetime,
+                        **atr_state,
                     )
-                    self.db.save_position_state(new_position)
+                    self.set_stop_constants(new_position)
+                    self.save_position_state(new_position)
                     self.logger.info(
                         f"🧱 立即建仓 {to_symbol}: entry={real_price:.8f}, ATR={atr:.8f} ({atr_pct:.2f}%), "
                         f"初始止损={stop_price:.8f}"
                     )
             else:
                 # 提取失败，下轮 scout 将使用 ticker fallback
-                ticker_price = self.manager.get_ticker_price(to_coin_pair)
+                ticker_price = self.get_ticker_price(to_coin_pair)
                 self.logger.warning(
                     f"⚠️  无法从订单中提取 {to_symbol} 真实成交信息，"
                     f"下轮 scout 将使用 ticker={ticker_price:.8f} 建仓 "
@@ -91,9 +91,8 @@ class Strategy:
             # 1. 获取所有仓位（只调用一次API）
             positions = self.manager.get_all_positions()
 
-            # 2. 管理现有仓位
-            for position in positions:
-                self._check_position_risk(position)
+            # 2. 管理现有仓位：触发止损/止盈的仓位一起平掉
+            self._close_positions([p for p in positions if self._check_position_risk(p)])
 
             # 3. 如果仓位数未满，寻找新机会
             if len(positions) < self.max_positions:
@@ -103,13 +102,14 @@ class Strategy:
         except Exception as e:
             self.logger.error(f"侦察循环异常: {e}")
 
-    def _check_position_risk(self, position: FuturesPosition):
+    def _check_position_risk(self, position: FuturesPosition) -> bool:
         """
         检查仓位的止损/止盈
         （复用之前的逻辑）
+        Returns: 是否需要平仓
         """
         if position.entry_price <= 0:
-            return
+            return False
 
         # 计算盈亏百分比
         if position.side == 'LONG':
@@ -122,28 +122,28 @@ class Strategy:
             self.logger.warning(
                 f"🛑 {position.symbol} {position.side}仓触发止损！亏损 {pnl_pct:.2f}%"
             )
-            self._close_position(position)
-            return
+            return True
 
         # 止盈检查
         if pnl_pct >= self.take_profit_pct:
             self.logger.info(
                 f"💰 {position.symbol} {position.side}仓触发止盈！盈利 {pnl_pct:.2f}%"
             )
-            self._close_position(position)
-            return
+            return True
 
-    def _close_position(self, position: FuturesPosition):
-        """平仓"""
-        if position.side == 'LONG':
-            result = self.manager.close_long(position.symbol, position.quantity)
-        else:
-            result = self.manager.close_short(position.symbol, position.quantity)
+        return False
 
-        if result:
-            self.logger.info(f"✅ 成功平仓 {position.symbol} {position.side}仓")
-        else:
-            self.logger.error(f"❌ 平仓失败 {position.symbol} {position.side}仓")
+    def _close_positions(self, positions: List[FuturesPosition]):
+        """平仓（多个仓位一起提交，某个交易对的失败重试不拖慢其他交易对）"""
+        results = self.manager.place_orders(
+            [('close', position.side.lower(), position.symbol, position.quantity) for position in positions]
+        )
+
+        for position, result in zip(positions, results):
+            if result:
+                self.logger.info(f"✅ 成功平仓 {position.symbol} {position.side}仓")
+            else:
+                self.logger.error(f"❌ 平仓失败 {position.symbol} {position.side}仓")
 
     def _scan_and_open_positions(self, existing_positions: List[FuturesPosition]):
         """
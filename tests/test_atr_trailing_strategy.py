@@ -0,0 +1,138 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from binance_trade_bot.models import PositionState
+from binance_trade_bot.strategies.atr_trailing_strategy import Strategy
+
+T0 = datetime(2024, 1, 1)
+HOUR_MS = 3600 * 1000
+
+
+def make_bars(count, seed=7):
+    """随机游走生成 fetch_klines 格式的K线：high / low / close / open_time(毫秒)"""
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, count))
+    high = close + rng.uniform(0.1, 2.0, count)
+    low = close - rng.uniform(0.1, 2.0, count)
+    open_time = int(T0.timestamp() * 1000) + np.arange(count) * HOUR_MS
+    return np.column_stack([high, low, close, open_time]).astype(np.float64)
+
+
+def make_strategy(bars):
+    """不经过 initialize，只装配 ATR 计算用到的属性；fetch_klines 按模拟时间切片 bars"""
+    strategy = Strategy.__new__(Strategy)
+    strategy.manager = SimpleNamespace(datetime=T0)
+    strategy.logger = SimpleNamespace(error=lambda *a, **k: None, warning=lambda *a, **k: None)
+    strategy.atr_timeframe = "1h"
+    strategy.atr_period = 14
+    strategy.atr_lookback = 30
+    strategy.atr_failure_count = 0
+
+    def fetch_klines(coin_pair, interval, limit, min_bars=None):
+        # 当前时间所在的那根K线尚未收盘，作为最后一根返回
+        forming = int((strategy.manager.datetime - T0).total_seconds() // 3600)
+        return bars[max(0, forming + 1 - limit):forming + 1]
+
+    strategy.fetch_klines = fetch_klines
+    return strategy
+
+
+def wilder_atr(klines, period):
+    """逐根递推的 Wilder ATR 参考实现"""
+    trs = [
+        max(high - low, abs(high - prev_close), abs(low - prev_close))
+        for (high, low, _, _), (_, _, prev_close, _) in zip(klines[1:], klines[:-1])
+    ]
+    atr = sum(trs[:period]) / period
+    for tr in trs[period:]:
+        atr = (atr * (period - 1) + tr) / period
+    return atr
+
+
+def test_compute_atr_matches_wilder_recursion():
+    bars = make_bars(60)
+    strategy = make_strategy(bars)
+    assert strategy.compute_atr(bars, 14) == pytest.approx(wilder_atr(bars, 14), rel=1e-12)
+    assert strategy.compute_atr(bars[:14], 14) == 0.0
+
+
+def test_incremental_atr_matches_full_recompute():
+    bars = make_bars(80)
+    strategy = make_strategy(bars)
+    first_forming = 40
+    strategy.manager.datetime = T0 + timedelta(hours=first_forming, minutes=5)
+
+    state = strategy.compute_atr_state("BNBUSDT", 100.0)
+    start = first_forming + 1 - strategy.atr_lookback
+    assert state["atr_wilder"] == pytest.approx(strategy.compute_atr(bars[start:first_forming], 14), rel=1e-12)
+    assert state["atr_bar_open_time"] == int(bars[first_forming - 1, 3])
+
+    st = PositionState(symbol="BNBUSDT", last_atr_update_time=strategy.manager.datetime, **state)
+    for forming in range(first_forming + 1, 70):
+        strategy.manager.datetime = T0 + timedelta(hours=forming, minutes=5)
+        assert strategy.refresh_atr_incremental(st, "BNBUSDT", float(bars[forming, 2]))
+        st.last_atr_update_time = strategy.manager.datetime
+
+        # 增量状态必须等于从同一起点对全部已收盘K线重新计算的结果
+        full = strategy.compute_atr(bars[start:forming], 14)
+        assert st.atr_wilder == pytest.approx(full, rel=1e-9)
+        assert st.prev_close == bars[forming - 1, 2]
+        assert st.atr_bar_open_time == int(bars[forming - 1, 3])
+
+
+def test_incremental_atr_rejects_gap():
+    bars = make_bars(60)
+    strategy = make_strategy(bars)
+    strategy.manager.datetime = T0 + timedelta(hours=40, minutes=5)
+    state = strategy.compute_atr_state("BNBUSDT", 100.0)
+    st = PositionState(symbol="BNBUSDT", last_atr_update_time=strategy.manager.datetime, **state)
+
+    # 漏掉中间的K线时交给调用方全量重算，不改动已有状态
+    st.atr_bar_open_time -= 2 * HOUR_MS
+    strategy.manager.datetime += timedelta(hours=1)
+    assert not strategy.refresh_atr_incremental(st, "BNBUSDT", 100.0)
+    assert st.atr_wilder == state["atr_wilder"]
+
+
+def test_klines_breaker_backs_off_in_simulated_time():
+    bars = make_bars(60)
+    strategy = make_strategy(bars)
+    del strategy.fetch_klines  # 用真实的 fetch_klines，K线来自下面的假 Client
+    strategy.klines_cache = None
+    strategy._live_klines = {}
+    strategy._klines_ttl_cache = OrderedDict()
+    strategy._klines_ttl_lock = threading.Lock()
+    strategy.klines_ttl_max_entries = 64
+    strategy._breaker = {}
+    strategy._breaker_lock = threading.Lock()
+    strategy.breaker_max_backoff = 300
+    strategy._prefetch_local = threading.local()
+
+    calls = []
+
+    def get_klines(symbol, interval, limit, startTime=None):
+        calls.append(strategy.manager.datetime)
+        if len(calls) == 1:
+            raise ConnectionError("timeout")
+        forming = int((strategy.manager.datetime - T0).total_seconds() // 3600)
+        return [[int(t), "0", str(h), str(l), str(c)] for h, l, c, t in bars[forming + 1 - limit:forming + 1]]
+
+    strategy.manager.binance_client = SimpleNamespace(get_klines=get_klines)
+    strategy.manager.datetime = T0 + timedelta(hours=40)
+
+    assert strategy.fetch_klines("BNBUSDT", "1h", 20) is None
+    # 第一次失败后退避 2 秒（模拟时间），期间不发请求
+    strategy.manager.datetime += timedelta(seconds=1)
+    assert strategy.fetch_klines("BNBUSDT", "1h", 20) is None
+    assert len(calls) == 1
+
+    strategy.manager.datetime += timedelta(seconds=2)
+    klines = strategy.fetch_klines("BNBUSDT", "1h", 20)
+    assert len(calls) == 2
+    assert np.array_equal(klines, bars[21:41])
+    assert strategy._breaker == {}
@@ -0,0 +1,119 @@
+import threading
+import time
+from types import SimpleNamespace
+
+from binance.exceptions import BinanceAPIException
+
+from binance_trade_bot.binance_futures_api_manager import BinanceFuturesAPIManager, FuturesPosition
+from binance_trade_bot.strategies.futures_multi_coin_strategy import Strategy as MultiCoinStrategy
+
+
+class FakeFuturesClient:
+    """记录下单调用；fail_first 中的交易对第一次下单返回 API 错误，并检查是否有并发请求"""
+
+    def __init__(self, fail_first=()):
+        self.fail_first = set(fail_first)
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def futures_create_order(self, **params):
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            time.sleep(0.01)
+            self.calls.append(params)
+            if params['symbol'] in self.fail_first:
+                self.fail_first.discard(params['symbol'])
+                response = SimpleNamespace(text='{"code": -1001, "msg": "Internal error"}', status_code=500)
+                raise BinanceAPIException(response, 500, response.text)
+            return {'orderId': len(self.calls), 'symbol': params['symbol']}
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+def make_manager(client):
+    """不经过 __init__（不连接交易所），精度表视为已加载"""
+    manager = BinanceFuturesAPIManager.__new__(BinanceFuturesAPIManager)
+    manager.binance_client = client
+    manager.logger = SimpleNamespace(info=lambda *a: None, warning=lambda *a: None, error=lambda *a: None)
+    manager._precision_table = {}
+    manager._precision_mult = {'BTCUSDT': 1000, 'ETHUSDT': 1000, 'SOLUSDT': 100}
+    manager._precision_expiry = float('inf')
+    manager._client_lock = threading.Lock()
+    return manager
+
+
+def test_place_orders_serializes_client_requests_and_keeps_order(monkeypatch):
+    sleep = time.sleep
+    monkeypatch.setattr(time, 'sleep', lambda seconds: sleep(min(seconds, 0.01)))
+    client = FakeFuturesClient(fail_first={'ETHUSDT'})
+    manager = make_manager(client)
+
+    results = manager.place_orders([
+        ('close', 'long', 'BTCUSDT', 0.0123),
+        ('close', 'short', 'ETHUSDT', 1.5),
+        ('open', 'long', 'SOLUSDT', 2.345),
+    ])
+
+    assert client.max_active == 1
+    assert [r['symbol'] for r in results] == ['BTCUSDT', 'ETHUSDT', 'SOLUSDT']
+    assert len(client.calls) == 4  # ETHUSDT 重试了一次
+    sol = next(c for c in client.calls if c['symbol'] == 'SOLUSDT')
+    assert sol == {'symbol': 'SOLUSDT', 'side': 'BUY', 'positionSide': 'LONG', 'type': 'MARKET', 'quantity': 2.34}
+
+
+def test_place_orders_invalid_operation_returns_none():
+    manager = make_manager(FakeFuturesClient())
+    assert manager.place_orders([('open', 'sideways', 'BTCUSDT', 1.0)]) == [None]
+    assert manager.place_orders([]) == []
+
+
+def test_multi_coin_strategy_closes_triggered_positions_in_one_batch():
+    submitted = []
+    manager = SimpleNamespace(place_orders=lambda orders: submitted.extend(orders) or [{}] * len(orders))
+    logger = SimpleNamespace(info=lambda *a: None, warning=lambda *a: None, error=lambda *a: None)
+    strategy = MultiCoinStrategy(manager, None, logger, None)
+
+    def position(symbol, side, entry, mark):
+        return FuturesPosition(symbol, side, 1.0, entry, mark, 0.0, 0.0)
+
+    positions = [
+        position('BTCUSDT', 'LONG', 100.0, 94.0),    # 止损
+        position('ETHUSDT', 'SHORT', 100.0, 84.0),   # 止盈
+        position('SOLUSDT', 'LONG', 100.0, 101.0),   # 继续持有
+    ]
+    strategy._close_positions([p for p in positions if strategy._check_position_risk(p)])
+
+    assert submitted == [('close', 'long', 'BTCUSDT', 1.0), ('close', 'short', 'ETHUSDT', 1.0)]
+
+
+def test_precision_refresh_failure_waits_before_retrying(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(time, 'monotonic', lambda: clock[0])
+    calls = []
+
+    def futures_exchange_info():
+        calls.append(clock[0])
+        if len(calls) == 1:
+            response = SimpleNamespace(text='{"code": -1001, "msg": "Internal error"}', status_code=500)
+            raise BinanceAPIException(response, 500, response.text)
+        return {'symbols': [{'symbol': 'BTCUSDT', 'quantityPrecision': 3, 'pricePrecision': 1}]}
+
+    manager = make_manager(SimpleNamespace(futures_exchange_info=futures_exchange_info))
+    manager._precision_table = {'ETHUSDT': {'quantity_precision': 2, 'price_precision': 2}}
+    manager._precision_expiry = 0.0
+
+    # 失败时保留旧表，重试间隔内不再请求
+    assert manager.get_symbol_precision('ETHUSDT') == {'quantity_precision': 2, 'price_precision': 2}
+    clock[0] += 30
+    manager._format_quantity('ETHUSDT', 1.234)
+    manager.get_symbol_precision('BTCUSDT')
+    assert len(calls) == 1
+
+    clock[0] += 31
+    assert manager.get_symbol_precision('BTCUSDT') == {'quantity_precision': 3, 'price_precision': 1}
+    assert len(calls) == 2